@@ -0,0 +1,59 @@
+// Decoders for utils/transport.py payloads, used by clientside callbacks
+(function () {
+    const arrays = {
+        i1: Int8Array, u1: Uint8Array, i2: Int16Array, u2: Uint16Array,
+        i4: Int32Array, u4: Uint32Array, f4: Float32Array, f8: Float64Array,
+    };
+
+    function decodeArray(spec) {
+        const raw = atob(spec.bdata);
+        const bytes = new Uint8Array(raw.length);
+        for (let i = 0; i < raw.length; i++) { bytes[i] = raw.charCodeAt(i); }
+        return new arrays[spec.dtype](bytes.buffer);
+    }
+
+    function decodeLabels(spec) {
+        return Array.from(decodeArray(spec.codes), (c) => spec.values[c]);
+    }
+
+    function isLabels(value) {
+        return value && value.codes !== undefined;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        transport: {
+            // Expand encode_labels text of Plotly traces
+            figure: function (fig) {
+                if (!fig) { return window.dash_clientside.no_update; }
+                const data = fig.data.map((trace) => {
+                    const out = Object.assign({}, trace);
+                    for (const key of ["text", "hovertext"]) {
+                        if (isLabels(trace[key])) {
+                            out[key] = decodeLabels(trace[key]);
+                        }
+                    }
+                    return out;
+                });
+                return Object.assign({}, fig, {data: data});
+            },
+            // encode_columns block -> AG Grid getRowsResponse
+            rows: function (block) {
+                if (!block) { return window.dash_clientside.no_update; }
+                const names = Object.keys(block.columns);
+                const columns = names.map((name) => {
+                    const spec = block.columns[name];
+                    if (isLabels(spec)) { return decodeLabels(spec); }
+                    return Array.from(decodeArray(spec),
+                                      (v) => Number.isNaN(v) ? null : v);
+                });
+                const rowData = [];
+                for (let i = 0; i < block.rows; i++) {
+                    const row = {};
+                    names.forEach((name, j) => { row[name] = columns[j][i]; });
+                    rowData.push(row);
+                }
+                return {rowData: rowData, rowCount: block.rowCount};
+            },
+        },
+    });
+})();
@@ -0,0 +1,294 @@
+""" Time the dashboard data path on synthetic HDB-shaped data, offline.
+
+Covers the ingest pipeline, the data_process cleaners, df_filter under
+representative filters, grid_format and the update_* callbacks end to end
+(a new search: filter results and figures are cold, the per-snapshot
+background traces warm). Each case reports p50/p99 latency, rows per
+second at p50 and peak RSS growth while it ran, and is compared against
+benchmarks/baseline.json.
+
+    python benchmarks/bench_dashboard.py                  # 10k, 100k, 1M
+    python benchmarks/bench_dashboard.py --rows 5000000
+    python benchmarks/bench_dashboard.py --save           # new baseline
+    python benchmarks/bench_dashboard.py --check          # exit 1 if slower
+
+Baselines are only comparable on the machine that recorded them.
+"""
+import argparse
+import atexit
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import polars as pl
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+from synthetic import hdb_records, recent_months  # noqa: E402
+
+baseline_path = os.path.join(root, "benchmarks", "baseline.json")
+
+# (name, town, flat types or None for all, area_type, price_type,
+#  min_area, max_area, min_price, max_price, min_lease, max_lease, street)
+searches = [
+    ("all", "All", None, "area_sqft", "price",
+     None, None, None, None, None, None, None),
+    ("town_flat", "BEDOK", ["4RM", "5RM"], "area_sqm", "price",
+     None, None, None, None, None, None, None),
+    ("ranges", "All", None, "area_sqft", "price_area",
+     900, 1300, 400, 700, None, None, None),
+    ("lease_street", "TAMPINES", None, "area_sqft", "price",
+     None, None, None, None, 60, 80, "ave"),
+]
+
+
+class PeakRSS:
+    """ Highest resident set size seen while the block runs, in bytes.
+
+    Polars and numpy allocate outside the Python heap, so RSS is sampled
+    from /proc instead of using tracemalloc. Elsewhere only the process
+    peak from getrusage is available.
+    """
+
+    def __init__(self, interval: float = 0.002):
+        self.interval = interval
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+
+    @staticmethod
+    def rss() -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.rss())
+
+    def __enter__(self):
+        self.start = self.peak = self.rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.rss())
+
+    @property
+    def growth(self) -> int:
+        return self.peak - self.start
+
+
+def measure(fn, rows: int, repeat: int, setup=None) -> dict:
+    """ Run `fn` `repeat` times after one untimed warm-up run """
+    times = []
+    with PeakRSS() as mem:
+        if setup:
+            setup()
+        fn()
+        for _ in range(repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+    p50, p99 = np.percentile(times, [50, 99])
+    return {
+        "rows": rows,
+        "p50_ms": round(p50 * 1000, 3),
+        "p99_ms": round(p99 * 1000, 3),
+        "rows_per_s": round(rows / p50) if p50 else None,
+        "peak_mb": round(mem.growth / 2 ** 20, 1),
+    }
+
+
+def import_dashboard():
+    """ Import public_housing against a tiny seeded store, never the API """
+    tmp = tempfile.mkdtemp(prefix="hdb-bench-")
+    atexit.register(shutil.rmtree, tmp, True)
+    os.environ.update({
+        "HDB_SNAPSHOT_DIR": os.path.join(tmp, "hdb"),
+        "HDB_CHARTS_DIR": os.path.join(tmp, "charts"),
+        "HDB_REFRESH_MINUTES": "0",
+        "HDB_API_URL": "http://127.0.0.1:9/unreachable",
+    })
+    os.environ.pop("HDB_SHARED_DIR", None)
+
+    from utils.snapshot import SnapshotStore
+    store = SnapshotStore(os.environ["HDB_SNAPSHOT_DIR"])
+    for month in recent_months(8):
+        store.write_month(month, hdb_records(100, [month]))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import public_housing
+    return public_housing
+
+
+def run_size(ph, rows: int, repeat: int, ingest_repeat: int) -> dict:
+    from utils import data_process as dp
+    from utils.filter_engine import FilterEngine
+    from utils.registry import Snapshot
+
+    months = recent_months(6)
+    raw = hdb_records(rows, months)
+    results = {}
+
+    def case(name, fn, n=repeat, setup=None, per_row=True):
+        results[name] = r = measure(fn, rows, n, setup)
+        if not per_row:
+            r["rows_per_s"] = None
+        rate = "-" if r["rows_per_s"] is None else f"{r['rows_per_s']:,}"
+        print(f"  {name:<28} p50 {r['p50_ms']:10.2f} ms  "
+              f"p99 {r['p99_ms']:10.2f} ms  "
+              f"{rate:>14} rows/s  {r['peak_mb']:8.1f} MB")
+
+    # Ingest: parse raw strings, then build the snapshot, index and cube
+    case("ingest.process_hdb_data",
+         lambda: ph.process_hdb_data(raw, months), ingest_repeat)
+    df = ph.process_hdb_data(raw, months)
+
+    def build_snapshot():
+        snapshot = Snapshot.from_frame(df, months)
+        FilterEngine(lambda version: df).prepare(snapshot.version, df)
+    case("ingest.snapshot", build_snapshot, ingest_repeat)
+
+    cleaners = raw.select(pl.col("remaining_lease").alias("lease_left"),
+                          pl.col("flat_type").alias("flat"))
+    case("process_df.polars", lambda: dp.process_df_flat(
+        dp.process_df_lease_left(cleaners)))
+    pandas_cleaners = cleaners.to_pandas()
+    case("process_df.pandas", lambda: dp.process_df_flat(
+        dp.process_df_lease_left(pandas_cleaners.copy())), ingest_repeat)
+
+    # Serve the synthetic snapshot as a live one
+    snapshot = Snapshot.from_frame(df, months)
+    with contextlib.redirect_stdout(io.StringIO()):
+        ph.publish_snapshot(snapshot)
+
+    def cold():
+        ph.filter_engine._results.clear()
+        ph.figure_cache._figures.clear()
+
+    # Column definitions only depend on the columns, not the row count
+    case("grid_format", lambda: ph.grid_format(
+        ph.filter_engine._display_frame(snapshot.version, "area_sqft")),
+        per_row=False)
+
+    for name, town, flats, area_type, price_type, *ranges in searches:
+        min_area, max_area, min_price, max_price, min_lease, max_lease, \
+            street = ranges
+        flats = snapshot.flat_types if flats is None else flats
+        inputs = (town, area_type, price_type, max_lease, min_lease,
+                  6, flats, max_area, min_area, max_price,
+                  min_price, street, snapshot.version)
+
+        case(f"df_filter.{name}", lambda: ph.df_filter(
+            6, town, flats, area_type, max_area, min_area,
+            price_type, max_price, min_price, min_lease, max_lease, street,
+            snapshot.version), setup=cold)
+
+        def search():
+            basic = (town, area_type, price_type, max_lease, min_lease)
+            data = ph.filtered_data(1, *inputs)
+            ph.update_table(data, area_type, price_type)
+            ph.update_table_rows({"startRow": 0, "endRow": 100}, data)
+            ph.update_text(data, *basic)
+            ph.update_g0(data, *basic)
+            ph.update_g2(data, *basic)
+            ph.update_g3(data, *basic)
+
+        case(f"callbacks.{name}", search, setup=cold)
+
+    ph.figure_cache._backgrounds.clear()
+    return results
+
+
+def machine() -> dict:
+    return {
+        "python": platform.python_version(),
+        "polars": pl.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """ Cases whose p50 is more than `tolerance` slower than the baseline """
+    regressions = []
+    for key, r in results.items():
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            continue
+        ratio = r["p50_ms"] / base["p50_ms"] if base["p50_ms"] else 1
+        # Ignore sub-millisecond jitter on the fastest cases
+        if ratio > 1 + tolerance and r["p50_ms"] - base["p50_ms"] > 1:
+            regressions.append((key, base["p50_ms"], r["p50_ms"], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+",
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--ingest-repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=baseline_path)
+    parser.add_argument("--save", action="store_true",
+                        help="write these results as the new baseline")
+    parser.add_argument("--check", action="store_true",
+                        help="exit 1 when a case regressed")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    os.chdir(root)
+    ph = import_dashboard()
+    results = {}
+    for rows in args.rows:
+        print(f"{rows:,} rows")
+        for name, r in run_size(ph, rows, args.repeat,
+                                args.ingest_repeat).items():
+            results[f"{name}@{rows}"] = r
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": machine(), "results": results}, f,
+                      indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print("No baseline yet, record one with --save")
+        return
+    if baseline.get("machine") != machine():
+        print("Baseline was recorded on a different machine:",
+              baseline.get("machine"))
+
+    regressions = compare(results, baseline, args.tolerance)
+    for key, before, after, ratio in regressions:
+        print(f"REGRESSION {key}: {before:.2f} -> {after:.2f} ms "
+              f"({ratio:.2f}x)")
+    if not regressions:
+        print(f"No case slower than the baseline by over "
+              f"{args.tolerance:.0%}")
+    if regressions and args.check:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+""" Compare the row-by-row cleaners with the vectorized pandas and Polars
+backends in utils/data_process.py on a synthetic frame.
+
+    python benchmarks/bench_data_process.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import data_process as dp  # noqa: E402
+
+
+def loop_lease_left(df: pd.DataFrame) -> pd.DataFrame:
+    """ Previous list comprehension implementation, kept for comparison """
+    df['lease_left'] = [i.replace('s', '') for i in df['lease_left']]
+    df['lease_left'] = [i.replace(' year', 'y') for i in df['lease_left']]
+    df['lease_left'] = [i.replace(' month', 'm') for i in df['lease_left']]
+    df['lease_yrs'] = [int(i[0])*12 for i in df['lease_left'].str.split("y")]
+    df['lease_mths'] = [0 if i[-1].strip().replace('m', '') == '' else int(
+        i[-1].strip().replace('m', '')) for i in df['lease_left'].str.split("y")]
+    df['lease_mths'] = (df['lease_yrs'] + df['lease_mths']).astype(np.int32)
+    del df['lease_left']
+    del df['lease_yrs']
+    return df
+
+
+def loop_flat(df: pd.DataFrame) -> pd.DataFrame:
+    df['flat'] = [i.replace(" ROOM", "R") for i in df['flat']]
+    df['flat'] = [i.replace("EXECUTIVE", "EC") for i in df['flat']]
+    df['flat'] = [i.replace("MULTI-GENERATION", "MG") for i in df['flat']]
+    return df
+
+
+def synthetic_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    years = rng.integers(40, 99, rows).astype(str)
+    months = rng.integers(0, 12, rows)
+    lease = np.where(months == 0, np.char.add(years, " years"),
+                     np.char.add(np.char.add(years, " years "), np.char.add(
+                         np.char.zfill(months.astype(str), 2), " months")))
+    flats = np.array(["2 ROOM", "3 ROOM", "4 ROOM", "5 ROOM", "EXECUTIVE",
+                      "MULTI-GENERATION"])
+    return pd.DataFrame({"lease_left": lease,
+                         "flat": flats[rng.integers(0, len(flats), rows)]})
+
+
+def timed(fn, frame, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        data = frame.copy() if isinstance(frame, pd.DataFrame) else frame
+        start = time.perf_counter()
+        out = fn(data)
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    frame = synthetic_frame(args.rows)
+    pl_frame = pl.from_pandas(frame)
+    cases = [
+        ("loop", lambda df: loop_flat(loop_lease_left(df)), frame),
+        ("pandas", lambda df: dp.process_df_flat(
+            dp.process_df_lease_left(df)), frame),
+        ("polars", lambda df: dp.process_df_flat(
+            dp.process_df_lease_left(df)), pl_frame),
+    ]
+
+    results = {}
+    for name, fn, data in cases:
+        results[name] = timed(fn, data, args.repeat)
+
+    # All backends must agree before timings mean anything
+    expected = results["loop"][1]
+    for name in ("pandas", "polars"):
+        out = results[name][1]
+        out = out.to_pandas() if isinstance(out, pl.DataFrame) else out
+        assert (out["lease_mths"].to_numpy() ==
+                expected["lease_mths"].to_numpy()).all(), name
+        assert (out["flat"].to_numpy() == expected["flat"].to_numpy()).all()
+
+    base = results["loop"][0]
+    print(f"{args.rows:,} rows, best of {args.repeat}")
+    for name, (seconds, _) in results.items():
+        print(f"  {name:<7} {seconds * 1000:10.1f} ms  {base / seconds:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
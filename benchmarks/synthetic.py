@@ -0,0 +1,66 @@
+""" Synthetic data.gov.sg resale records for offline benchmarks.
+
+Columns, string formats and value ranges follow the datastore_search
+records public_housing ingests, so every parsing step does real work.
+"""
+from __future__ import annotations
+
+from datetime import date
+
+import numpy as np
+import polars as pl
+
+towns = [
+    "ANG MO KIO", "BEDOK", "BISHAN", "BUKIT BATOK", "BUKIT MERAH",
+    "BUKIT PANJANG", "BUKIT TIMAH", "CENTRAL AREA", "CHOA CHU KANG",
+    "CLEMENTI", "GEYLANG", "HOUGANG", "JURONG EAST", "JURONG WEST",
+    "KALLANG/WHAMPOA", "MARINE PARADE", "PASIR RIS", "PUNGGOL",
+    "QUEENSTOWN", "SEMBAWANG", "SENGKANG", "SERANGOON", "TAMPINES",
+    "TOA PAYOH", "WOODLANDS", "YISHUN",
+]
+flat_types = ["1 ROOM", "2 ROOM", "3 ROOM", "4 ROOM", "5 ROOM", "EXECUTIVE",
+              "MULTI-GENERATION"]
+flat_weights = [0.01, 0.03, 0.25, 0.4, 0.24, 0.065, 0.005]
+flat_areas = [31, 45, 68, 93, 113, 143, 160]
+street_kinds = ["AVE", "ST", "RD", "DR", "CRES", "CTRL", "RING RD"]
+
+
+def recent_months(count: int, today: date | None = None) -> list:
+    """ The last `count` months up to and including this one, oldest first """
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1
+    return [f"{i // 12}-{i % 12 + 1:02d}"
+            for i in range(index - count + 1, index + 1)]
+
+
+def _pick(pool: list, idx: np.ndarray) -> pl.Series:
+    return pl.Series(pool).gather(idx)
+
+
+def hdb_records(rows: int, months: list, seed: int = 0) -> pl.DataFrame:
+    """ `rows` raw records spread over `months`, every column a string """
+    rng = np.random.default_rng(seed)
+    flat = rng.choice(len(flat_types), rows, p=flat_weights)
+    area = np.clip(np.array(flat_areas)[flat] + rng.normal(0, 8, rows),
+                   28, 250).round().astype(np.int64)
+    price = (area * rng.uniform(3_500, 9_000, rows) / 1000).round() * 1000
+
+    streets = [f"{t.split()[0]} {k} {n}" for t in towns for k in street_kinds
+               for n in range(1, 4)]
+    storeys = [f"{lo:02d} TO {lo + 2:02d}" for lo in range(1, 50, 3)]
+    leases = [f"{y} years" + (f" {m:02d} months" if m else "")
+              for y in range(40, 99) for m in range(12)]
+
+    return pl.DataFrame({
+        "month": _pick(months, rng.integers(0, len(months), rows)),
+        "town": _pick(towns, rng.integers(0, len(towns), rows)),
+        "flat_type": _pick(flat_types, flat),
+        "block": pl.Series(rng.integers(1, 999, rows)).cast(pl.Utf8),
+        "street_name": _pick(streets, rng.integers(0, len(streets), rows)),
+        "storey_range": _pick(storeys, rng.integers(0, 8, rows)
+                              + rng.integers(0, len(storeys) - 8, rows)
+                              * (rng.random(rows) < 0.2)),
+        "floor_area_sqm": pl.Series(area).cast(pl.Utf8),
+        "remaining_lease": _pick(leases, rng.integers(0, len(leases), rows)),
+        "resale_price": pl.Series(price.astype(np.int64)).cast(pl.Utf8),
+    })
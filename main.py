@@ -1,12 +1,23 @@
-import requests
+import asyncio
+import httpx
 import jinja2
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import RedirectResponse, HTMLResponse
+from fastapi.responses import RedirectResponse, HTMLResponse, \
+    PlainTextResponse
 from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from fastapi.middleware.wsgi import WSGIMiddleware
 from fastapi_blog import add_blog_to_fastapi
-from public_housing import app as public_housing
+from utils import assets
+from utils.blog_cache import BlogCache, blog_router
+from utils.chart_cache import ChartCache
+from utils.http_client import http_client
+from utils.lazy_mount import LazyWSGIMount
+from utils.metrics import metrics
+from utils.response_cache import CacheRule, MemoryBackend, \
+    ResponseCacheMiddleware
+from utils.startup import startup_timer
+from utils.static_files import PrecompressedStaticFiles
+from utils.trend_charts import TrendCharts, plotlyjs_src
 # from private_housing import app as private_housing
 # from location_map import app as location_map
 
@@ -15,11 +26,78 @@ django_style_jinja2_loader = jinja2.ChoiceLoader([
     jinja2.PackageLoader("fastapi_blog", "templates"),
 ])
 
-app = FastAPI()
-app = add_blog_to_fastapi(app, jinja2_loader=django_style_jinja2_loader)
+gurl = "https://raw.githubusercontent.com/cliffchew84/cliffchew84.github.io/"
+bar_plot = "master/profile/assets/charts/mth_barline_chart.html"
+box_plot = "master/profile/assets/charts/mth_boxplot.html"
+stackbar_values = "master/profile/assets/charts/mth_stack_bar_values.html"
+stackbar_percent = "master/profile/assets/charts/mth_stack_bar_percent.html"
 
-app.mount('/static', StaticFiles(directory='static'), name='static')
-app.mount("/public_housing", WSGIMiddleware(public_housing.server))
+# Charts rendered locally from the HDB snapshot by public_housing
+trend_charts = TrendCharts()
+
+# Template variable -> chart fragment URL, used until local charts exist
+chart_cache = ChartCache({
+    "gh_html_content_1": gurl + box_plot,
+    "gh_html_content_2": gurl + bar_plot,
+    "gh_html_content_3": gurl + stackbar_values,
+    "gh_html_content_4": gurl + stackbar_percent,
+})
+
+
+def load_public_housing():
+    # Importing fetches and indexes the HDB data, keep it off startup
+    from public_housing import app as public_housing
+    return public_housing.server
+
+
+public_housing = LazyWSGIMount(load_public_housing, "public_housing")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_timer.mark("fastapi ready")
+    # Outbound requests from here on share one client on this loop
+    await http_client.start()
+    # Warm the chart cache and Dash app without holding up startup
+    warm_ups = [asyncio.create_task(public_housing.warm_up()),
+                asyncio.create_task(asyncio.to_thread(assets.ensure_built))]
+    if trend_charts.fragments() is None:
+        warm_ups.append(asyncio.create_task(chart_cache.warm_up()))
+    yield
+    for task in warm_ups:
+        task.cancel()
+    await chart_cache.close()
+    await http_client.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Rendered HTML routes, kept here and at the CDN. Content changes daily at
+# most, stale pages are served while the CDN revalidates in the background
+response_cache = MemoryBackend()
+app.add_middleware(ResponseCacheMiddleware, backend=response_cache, rules={
+    "/sg-public-home-trends": CacheRule(ttl=600, stale=86400),
+    "/public-homes": CacheRule(ttl=3600, stale=86400),
+    "/blog/": CacheRule(ttl=300, stale=3600),
+})
+metrics.watch_cache("responses", response_cache)
+with startup_timer.step("blog"):
+    # Same routes as the blog package, but served from memory with ETags.
+    # Included first so they win, the package still handles /blog/{page_id}
+    blog_cache = BlogCache()
+    blog_cache.refresh()
+    blog_templates = Jinja2Templates(env=jinja2.Environment(
+        loader=django_style_jinja2_loader,
+        extensions=["jinja2_time.TimeExtension", "jinja2.ext.debug"]))
+    app.include_router(blog_router(blog_templates, blog_cache),
+                       prefix="/blog", tags=["blog"])
+    app = add_blog_to_fastapi(app, jinja2_loader=django_style_jinja2_loader,
+                              mount_statics=False)
+
+# Serves the blog's package statics too, in place of its own mount
+app.mount('/static', PrecompressedStaticFiles(
+    directory='static', packages=[("fastapi_blog", "static")]), name='static')
+app.mount("/public_housing", public_housing)
 # app.mount("/private_housing", WSGIMiddleware(private_housing.server))
 # app.mount("/location_map", WSGIMiddleware(location_map.server))
 templates = Jinja2Templates(directory='templates')
@@ -37,43 +115,30 @@ async def read_root(request: Request):
 #         "private_home_dash.html", {"request": request})
 
 
-gurl = "https://raw.githubusercontent.com/cliffchew84/cliffchew84.github.io/"
-bar_plot = "master/profile/assets/charts/mth_barline_chart.html"
-box_plot = "master/profile/assets/charts/mth_boxplot.html"
-stackbar_values = "master/profile/assets/charts/mth_stack_bar_values.html"
-stackbar_percent = "master/profile/assets/charts/mth_stack_bar_percent.html"
-
-
 @app.get("/sg-public-home-trends", response_class=HTMLResponse)
 async def render_html(request: Request):
-    try:
-        resp_1 = requests.get(gurl + box_plot)
-        resp_1.raise_for_status()  # Check for HTTP errors
-        html_content_1 = resp_1.text
+    charts = trend_charts.fragments()
+    if charts is not None:
+        return templates.TemplateResponse(
+            "dash_page.html",
+            {"request": request, **charts,
+             "plotlyjs_src": assets.bundle_url() or plotlyjs_src})
 
-        resp_2 = requests.get(gurl + bar_plot)
-        resp_2.raise_for_status()  # Check for HTTP errors
-        html_content_2 = resp_2.text
+    try:
+        charts = await chart_cache.get_all()
+    except httpx.HTTPError as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error fetching HTML: {str(e)}")
 
-        resp_3 = requests.get(gurl + stackbar_values)
-        resp_3.raise_for_status()  # Check for HTTP errors
-        html_content_3 = resp_3.text
+    return templates.TemplateResponse(
+        "dash_page.html", {"request": request, **charts})
 
-        resp_4 = requests.get(gurl + stackbar_percent)
-        resp_4.raise_for_status()  # Check for HTTP errors
-        html_content_4 = resp_4.text
 
-        return templates.TemplateResponse(
-            "dash_page.html", {
-                "request": request,
-                "gh_html_content_1": html_content_1,
-                "gh_html_content_2": html_content_2,
-                "gh_html_content_3": html_content_3,
-                "gh_html_content_4": html_content_4,
-            })
-    except requests.RequestException as e:
-        raise HTTPException(
-            status_code=500, detail=f"Error fetching HTML: {str(e)}")
+@app.get("/metrics")
+async def read_metrics():
+    """ Prometheus scrape target for this worker """
+    return PlainTextResponse(metrics.render(),
+                             media_type="text/plain; version=0.0.4")
 
 
 @app.get("/")
@@ -1,27 +1,60 @@
 from dash import Dash, html, dcc, Input, Output, callback, State
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from dash import clientside_callback, ClientsideFunction, no_update
 import dash_bootstrap_components as dbc
-from datetime import datetime, date
+from datetime import datetime
 import plotly.graph_objects as go
 import dash_ag_grid as dag
 import polars as pl
+from utils.snapshot import SnapshotStore
+from utils.history_store import HistoryStore
+from utils.hdb_fetch import HDBFetcher, FetchError
+from utils.http_client import http_client
+from utils.registry import registry, Snapshot
+from utils.scheduler import RefreshScheduler
+from utils.shared_snapshot import SharedSnapshot
+from utils.filter_engine import FilterEngine, FilterParams
+from utils.row_model import get_rows
+from utils.figure_cache import FigureCache
+from utils.metrics import metrics
+from utils.transport import encode_array, encode_labels
+from utils.downsample import density_grid, sample_indices
+from utils.startup import startup_timer
+from utils.trend_charts import TrendCharts
+from utils import data_process as dp
 import numpy as np
-import requests
-import json
+import asyncio
+import tempfile
+import threading
+import time
+import os
 
 table_cols = ['month', 'town', 'flat', 'street', 'floor', 'lease', 'area_sqm',
               'area_sqft', 'price_sqm', 'price_sqft', 'price']
+# Typed columns parsed at ingest, used by the query path but not displayed
+typed_cols = ['lease_mths', 'lease_yrs', 'floor_lo', 'floor_hi']
 
-# Get current month and recent periods
-current_mth = datetime.now().date().strftime("%Y-%m")
-periods = [str(i)[:7] for i in pl.date_range(
-    datetime(2024, 1, 1),
-    datetime.now(),
-    interval='1mo',
-    eager=True).to_list()]
+def month_windows(now=None):
+    """ Months to keep fresh from data.gov.sg and months to show """
+    now = now or datetime.now()
+    periods = [str(i)[:7] for i in pl.date_range(
+        datetime(2024, 1, 1),
+        now,
+        interval='1mo',
+        eager=True).to_list()]
+
+    # Allows for first 10 days of a month to still include 7th month ago data
+    recent_periods = periods[-7:] if now.day <= 10 else periods[-6:]
+    selected_mths = periods[-6:]
+    return recent_periods, selected_mths
+
+
+def history_months(now=None):
+    """ Every month covered by the trend charts, or by full-history mode """
+    start = datetime.strptime(
+        history_start if history is not None else trend_charts.start, "%Y-%m")
+    return [str(i)[:7] for i in pl.date_range(
+        start, now or datetime.now(), interval='1mo', eager=True).to_list()]
 
-# Allows for first 10 days of a month to still include 7th month ago data
-recent_periods = periods[-7:] if datetime.now().day <= 10 else periods[-6:]
 
 # Define columns and URL
 df_cols = ['month', 'town', 'flat_type', 'block', 'street_name', 'storey_range',
@@ -30,65 +63,316 @@ param_fields = ",".join(df_cols)
 base_url = "https://data.gov.sg/api/action/datastore_search?resource_id="
 ext_url = "d_8b84c4ee58e3cfc0ece0d773c8ca6abc"
 full_url = base_url + ext_url
-empty_df = pl.DataFrame(schema=df_cols)
-
-# Function to make an API request
-def fetch_hdb_data(period):
-    params = {
-        "fields": param_fields,
-        "filters": json.dumps({'month': period}),
-        "limit": 10000
-    }
-    result = empty_df
-    response = requests.get(full_url, params=params)
-    if response.status_code == 200:
-        table_result = pl.DataFrame(response.json().get("result").get("records"))
-        if table_result.columns != []:
-            result = table_result
+empty_df = pl.DataFrame(schema={c: pl.String for c in df_cols})
+
+fetcher = HDBFetcher(os.environ.get("HDB_API_URL", full_url), df_cols)
+
+# Resale prices before 2017 live in older resources, keyed by first month.
+# They record when the lease started instead of the lease remaining.
+history_start = "1990-01"
+history_resources = [
+    ("1990-01", "d_ebc5ab87086db484f88045b47411ebc5"),
+    ("2000-01", "d_43f493c6c50d54243cc1eab0df142d6a"),
+    ("2012-03", "d_2d5ff9ea31397b66239f245f57751537"),
+    ("2015-01", "d_ea9ed51da2787afaf8e51f827c304208"),
+    ("2017-01", ext_url),
+]
+history_cols = [c for c in df_cols if c != 'remaining_lease'] + \
+    ['lease_commence_date']
+history_fetchers = {ext_url: fetcher}
+
+
+def fetcher_for(period):
+    """ Fetcher for the resource holding a month """
+    resource = [r for start, r in history_resources if start <= period][-1:]
+    if not resource or "HDB_API_URL" in os.environ:
+        return fetcher
+    if resource[0] not in history_fetchers:
+        history_fetchers[resource[0]] = HDBFetcher(
+            base_url + resource[0], history_cols)
+    return history_fetchers[resource[0]]
+
+
+def with_remaining_lease(df, period):
+    """ Remaining lease in whole years from the 99-year lease start """
+    year = int(period[:4])
+    return df.with_columns(
+        ((99 - year + pl.col("lease_commence_date").cast(pl.Int16))
+         .cast(pl.Utf8) + " years").alias("remaining_lease")
+    ).select(df_cols)
+
+
+async def fetch_hdb_data(period):
+    """ Fetch every page of a month and report how complete it is """
+    result = await fetcher_for(period).fetch_month(period)
+    if 'remaining_lease' not in result.df.columns:
+        result.df = with_remaining_lease(result.df, period)
+    print(f"{period}: {result.received:,} / {result.total:,} records "
+          f"({result.completeness:.0%})")
     return result
 
-# Use ThreadPoolExecutor to fetch data in parallel
-df = empty_df
-with ThreadPoolExecutor(max_workers=4) as executor:
-    futures = {executor.submit(
-        fetch_hdb_data, period): period for period in recent_periods}
-
-    for future in as_completed(futures):
-        mth_df = future.result()
-        df = pl.concat([df, mth_df], how='vertical_relaxed')
-
-# Data Processing
-df.columns = ['month', 'town', 'flat', 'block', 'street', 'floor', 
-              'area_sqm', 'lease_mths', 'price']
-
-yr, mth = datetime.now().year, datetime.now().month
-selected_mths = pl.date_range(
-    date(2024, 1, 1), date(yr, mth, 1), "1mo", eager=True).to_list()
-selected_mths = [i.strftime("%Y-%m") for i in selected_mths[-int(6):]]
-
-df = df.filter(
-    pl.col("month").is_in(selected_mths)
-).with_columns([
-    pl.col('area_sqm').cast(pl.Float32),
-    pl.col('price').cast(pl.Float32),
-    (pl.col("area_sqm").cast(pl.Float32) * 10.7639).alias('area_sqft'),
-    (pl.col("price").cast(pl.Float32) / pl.col("area_sqm").cast(pl.Float32)).alias('price_sqm'),
-    (pl.col("price").cast(pl.Float32) / (pl.col("area_sqm").cast(pl.Float32) * 10.7639)).alias("price_sqft"),
-    ("BLK " + pl.col('block') + " " + pl.col("street")).alias("street_name"),
-    pl.col('lease_mths')
-        .str.replace("s", "")
-        .str.replace(" year", "y")
-        .str.replace(" month", "m")
-        .alias('lease'),
-    pl.col('flat')
-        .str.replace(" ROOM", "RM")
-        .str.replace("EXECUTIVE", 'EC')
-        .str.replace("MULTI-GENERATION", "MG")
-        .alias('flat'),
-    pl.col("floor").str.replace(" TO ", "-").alias("floor")
-]).select(table_cols)
-
-print("Completed data extraction from data.gov.sg")
+
+async def fetch_months(periods):
+    return await asyncio.gather(
+        *[fetch_hdb_data(period) for period in periods],
+        return_exceptions=True)
+
+
+def fetch_periods(periods):
+    """ Fetch months from data.gov.sg concurrently on the shared client """
+    periods = list(periods)
+    if not periods:
+        return {}
+
+    results = {}
+    for period, result in zip(periods, http_client.run(fetch_months(periods))):
+        if isinstance(result, FetchError):
+            print(f"Unable to fetch {period}: {result}")
+        elif isinstance(result, Exception):
+            raise result
+        else:
+            results[period] = result
+    return results
+
+
+def refresh_snapshot(periods):
+    """ Download months that are not yet final into the snapshot store """
+    fetched = fetch_periods(store.pending(periods))
+    for period, result in fetched.items():
+        # Never replace a good snapshot with a partial month
+        if result.received > 0 and result.complete:
+            try:
+                store.write_month(period, result.df)
+            except OSError as e:
+                print(f"Unable to save {period} snapshot: {e}")
+    return {period: result.df for period, result in fetched.items()}
+
+
+def process_hdb_data(raw, selected_mths):
+    """ Typed, display-ready columns from raw data.gov.sg records """
+    df = raw.select(df_cols)
+    df.columns = ['month', 'town', 'flat', 'block', 'street', 'floor', 
+                  'area_sqm', 'lease_mths', 'price']
+
+    return df.filter(
+        pl.col("month").is_in(selected_mths)
+    ).with_columns([
+        pl.col('area_sqm').cast(pl.Float32),
+        pl.col('price').cast(pl.Float32),
+        (pl.col("area_sqm").cast(pl.Float32) * 10.7639).alias('area_sqft'),
+        (pl.col("price").cast(pl.Float32) / pl.col("area_sqm").cast(pl.Float32)).alias('price_sqm'),
+        (pl.col("price").cast(pl.Float32) / (pl.col("area_sqm").cast(pl.Float32) * 10.7639)).alias("price_sqft"),
+        ("BLK " + pl.col('block') + " " + pl.col("street")).alias("street_name"),
+        dp.lease_label_expr('lease_mths').alias('lease'),
+        dp.lease_months_expr('lease_mths').alias('lease_mths'),
+        dp.lease_years_expr('lease_mths').alias('lease_yrs'),
+        dp.flat_expr('flat', room="RM").alias('flat'),
+        pl.col("floor").str.replace(" TO ", "-").alias("floor"),
+        pl.col("floor").str.extract(r"^(\d+)", 1).cast(pl.Int16).alias("floor_lo"),
+        pl.col("floor").str.extract(r"(\d+)$", 1).cast(pl.Int16).alias("floor_hi"),
+    ]).select(table_cols + typed_cols)
+
+
+def build_snapshot(now=None):
+    """ Load the stored months, only blocking on data.gov.sg when none are """
+    recent_periods, selected_mths = month_windows(now)
+    raw = store.load(recent_periods)
+
+    if raw is None:
+        fetched = refresh_snapshot(recent_periods)
+        raw = store.load(recent_periods)
+        if raw is None:
+            raw = pl.concat([empty_df, *fetched.values()],
+                            how='vertical_relaxed')
+
+    with metrics.span("ingest"):
+        return Snapshot.from_frame(process_hdb_data(raw, selected_mths),
+                                   selected_mths)
+
+
+def publish_snapshot(snapshot, index=None, rounded=None):
+    """ Build indexes first so callbacks never see a half-built snapshot """
+    with metrics.span("index"):
+        filter_engine.prepare(snapshot.version, snapshot.df, index, rounded)
+    registry.publish(snapshot)
+    print(f"Serving snapshot {snapshot.version} "
+          f"({snapshot.df.shape[0]:,} rows)")
+
+
+def history_window(count, town="All"):
+    """ Snapshot version of the latest `count` months of full history.
+
+    The month and town filters are pushed into the scan, so only the
+    selected partitions and matching row groups are read. Each window is
+    built once per history version.
+    """
+    months = history.months()[-count:]
+    predicates = [pl.col("month").is_in(months)]
+    if town != "All":
+        predicates.append(pl.col("town") == town)
+    key = (history.version, tuple(months), town)
+    with window_lock:
+        version = window_versions.get(key)
+        if version is not None and \
+                registry.snapshot(version).version == version:
+            return version
+
+        with metrics.span("scan"):
+            df = history.scan(months, predicates) \
+                .select(table_cols + typed_cols).collect()
+        snapshot = Snapshot.from_frame(df, months)
+        with metrics.span("index"):
+            filter_engine.prepare(snapshot.version, snapshot.df)
+        window_versions[key] = registry.add(snapshot)
+        return snapshot.version
+
+
+def sync_history():
+    """ Convert newly stored months into history partitions """
+    written = history.sync(store, process_hdb_data)
+    if written:
+        print(f"Added {len(written):,} months to the full history")
+
+
+def publish_shared(entry):
+    """ Serve a memory-mapped shared snapshot unless it is already live """
+    if entry is not None and (registry.current is None or
+                              entry.snapshot.version != registry.current.version):
+        publish_snapshot(entry.snapshot, entry.index, entry.rounded)
+
+
+def refresh_and_swap():
+    """ Scheduled job: fetch unfinished months, swap in any new data """
+    recent_periods = month_windows()[0]
+    refresh_snapshot(recent_periods)
+    snapshot = build_snapshot()
+    if shared is not None:
+        # Always republish so workers see when the last refresh happened
+        shared.publish(snapshot)
+        publish_shared(shared.read())
+    elif registry.current is None or snapshot.version != registry.current.version:
+        publish_snapshot(snapshot)
+
+    # Older months only feed the trend charts and the full history, fetch
+    # the ones they lack once the dashboard is up to date
+    refresh_snapshot(backfill_months(recent_periods))
+    try:
+        trend_charts.update(store)
+    except OSError as e:
+        charts_failed.set()
+        print(f"Unable to save trend charts, backfill stopped: {e}")
+    if history is not None:
+        sync_history()
+
+
+def writable(path):
+    """ Whether files can be created under `path` """
+    try:
+        os.makedirs(path, exist_ok=True)
+        with tempfile.TemporaryFile(dir=path):
+            return True
+    except OSError:
+        return False
+
+
+def backfill_months(recent_periods):
+    """ Older months missing from the trend charts or the full history.
+
+    Both persist what they have summarised, so a process starting on an
+    empty snapshot store does not fetch them all again. Nothing is
+    backfilled where that cannot be kept, such as a read-only deploy, as
+    every process and refresh would fetch the same months again.
+    """
+    roots = [store.root, trend_charts.root] + \
+        ([] if history is None else [history.root])
+    if not backfill or charts_failed.is_set() or \
+            not all(writable(root) for root in roots):
+        return []
+
+    charted = set(trend_charts.months())
+    synced = set() if history is None else set(history.months())
+    return [m for m in history_months() if m not in recent_periods and (
+        m >= trend_charts.start and m not in charted or
+        history is not None and m not in synced)]
+
+
+def load_shared_snapshot():
+    """ The loader publishes the shared snapshot, other workers map it.
+
+    Only the process holding the loader lock builds or fetches. The others
+    wait for its snapshot with backoff, taking over if the loader exits.
+    """
+    wait = 1
+    while True:
+        if shared.acquire_loader():
+            shared.publish(build_snapshot(),
+                           refreshed_at=shared.refreshed_at())
+        entry = shared.wait(timeout=wait)
+        if entry is not None:
+            return entry
+        print(f"Waiting for the shared snapshot loader ({wait}s)")
+        wait = min(wait * 2, 60)
+
+
+def sync_shared():
+    """ Multi-worker job: the loader refreshes when due, the other workers
+    adopt whatever the loader last published """
+    if shared.acquire_loader() and \
+            time.time() - shared.refreshed_at() >= refresh_minutes * 60:
+        refresh_and_swap()
+    else:
+        publish_shared(shared.read())
+        if history is not None:
+            history.reload()
+
+
+store = SnapshotStore(os.environ.get("HDB_SNAPSHOT_DIR", "data/hdb"))
+trend_charts = TrendCharts(
+    start=os.environ.get("HDB_HISTORY_START", "2017-01"))
+# Opt-in: every resale since 1990 in partitioned Parquet, HDB_FULL_HISTORY=1
+full_history = os.environ.get("HDB_FULL_HISTORY", "0") == "1"
+history = HistoryStore(os.environ.get("HDB_HISTORY_DIR", "data/history")) \
+    if full_history else None
+# Older months for the trend charts and history, off with HDB_BACKFILL=0
+# where the data directories are not kept between processes
+backfill = os.environ.get("HDB_BACKFILL", "1") == "1"
+charts_failed = threading.Event()
+window_versions = {}
+window_lock = threading.Lock()
+# History windows keep their own indexes next to the live snapshots
+filter_engine = FilterEngine(registry.get, resolve_version=registry.resolve,
+                             max_versions=4 if full_history else 2)
+figure_cache = FigureCache()
+refresh_minutes = float(os.environ.get("HDB_REFRESH_MINUTES", 360))
+
+# Multi-worker mode, e.g. HDB_SHARED_DIR=data/shared uvicorn main:app
+# --workers 4: one loader fetches, every worker maps its published snapshot
+shared_dir = os.environ.get("HDB_SHARED_DIR")
+shared = SharedSnapshot(shared_dir) if shared_dir else None
+shared_poll_seconds = 30
+
+# Cold start from the last good snapshot, then refresh on a schedule
+with startup_timer.step("public_housing.snapshot"):
+    entry = None if shared is None else load_shared_snapshot()
+    snapshot = build_snapshot() if shared is None else entry.snapshot
+with startup_timer.step("public_housing.index"):
+    if entry is None:
+        publish_snapshot(snapshot)
+    else:
+        publish_shared(entry)
+if history is not None and (shared is None or shared.acquire_loader()):
+    with startup_timer.step("public_housing.history"):
+        sync_history()
+print("Completed data extraction from snapshot")
+
+if shared is None:
+    scheduler = RefreshScheduler(refresh_and_swap, refresh_minutes * 60,
+                                 name="hdb-refresh")
+else:
+    scheduler = RefreshScheduler(sync_shared, shared_poll_seconds,
+                                 name="hdb-refresh")
+if refresh_minutes > 0:
+    scheduler.start()
 
 # Initalise App
 app = Dash(__name__,
@@ -97,52 +381,54 @@ app = Dash(__name__,
            dbc.themes.BOOTSTRAP
            ],
     requests_pathname_prefix="/public_housing/")
+metrics.instrument_dash(app.server)
+metrics.watch_cache("filter_results", filter_engine)
+metrics.watch_cache("figures", figure_cache)
 
-# Chart parameters
-towns = df.select("town").unique().to_series().to_list()
-towns.sort()
-towns = ["All",] + towns
 
-flat_type_grps = df.select("flat").unique().to_series().to_list()
-flat_type_grps.sort()
-
-final_flat_type_grps = []
-for flat in flat_type_grps:
-    final_flat_type_grps.append({
+def flat_options(flat_types):
+    """ Dropdown options for flat types """
+    return [{
         "label": html.Span([flat], style={'background-color': "#FFC0BD",
                                           'border': "#FFC0BD",
                                           'color': 'black'}),
         "value": flat, "search": flat
-    })
+    } for flat in flat_types]
 
-period_grps = df.select("month").unique().to_series().to_list()
-price_max = df.select("price").max().rows()[0][0]
-price_min = df.select("price").min().rows()[0][0]
-area_max = df.select("area_sqft").max().rows()[0][0]
-area_min = df.select("area_sqft").min().rows()[0][0]
 
 legend = dict(orientation="h", yanchor="bottom", y=1.02, xanchor="left", x=.5)
 chart_width, chart_height = 680, 550
+# Scatter traces above this many points are binned or sampled server-side
+scatter_points = int(os.environ.get("HDB_SCATTER_POINTS", 20000))
 
-def convert_price_area(price_type, area_type):
-    """ Convert user price for table ftilers Plotly labels """ 
-
-    if price_type != 'price':
-        price_type = 'price_sqft' if area_type == 'area_sqft' else 'price_sqm'
-
-    return price_type
+def month_options():
+    """ Months dropdown, up to every stored month in full-history mode """
+    if history is None:
+        return [3, 6]
+    count = len(history.months())
+    return [3, 6] + [n for n in (12, 24, 60, 120) if n < count] + \
+        [{"label": "All", "value": count}]
 
 
 def grid_format(table: pl.DataFrame):
     """ Add custom formatting to AGrid Table Outputs """
+    text_filter = "agTextColumnFilter"
+    number_filter = "agNumberColumnFilter"
     output = [
-        {"field": "month", "sortable": True, 'width': 100, 'maxWidth': 100},
-        {"field": "flat", "sortable": True, 'width': 70, 'maxWidth': 70},
-        {"field": "town", "sortable": True, 'width': 180, 'maxWidth': 300},
-        {"field": "street", "sortable": True, 'width': 380, 'maxWidth': 800},
-        {"field": "floor", "sortable": True, 'width': 100, 'maxWidth': 130},
-        {"field": "lease", "sortable": True, 'width': 100, 'maxWidth': 100},
+        {"field": "month", "sortable": True, 'width': 100, 'maxWidth': 100,
+         "filter": text_filter},
+        {"field": "flat", "sortable": True, 'width': 70, 'maxWidth': 70,
+         "filter": text_filter},
+        {"field": "town", "sortable": True, 'width': 180, 'maxWidth': 300,
+         "filter": text_filter},
+        {"field": "street", "sortable": True, 'width': 380, 'maxWidth': 800,
+         "filter": text_filter},
+        {"field": "floor", "sortable": True, 'width': 100, 'maxWidth': 130,
+         "filter": text_filter},
+        {"field": "lease", "sortable": True, 'width': 100, 'maxWidth': 100,
+         "filter": text_filter},
         {"field": "price", "sortable": True, 'width': 150, 'maxWidth': 200, 
+         "filter": number_filter,
          "valueFormatter": {"function": "d3.format('($,.2f')(params.value)"},
         }
     ]
@@ -150,12 +436,14 @@ def grid_format(table: pl.DataFrame):
         if 'price_' in col:
             output.append({
                 "field": col, "sortable": True, 'width': 120, 'maxWidth': 120,
+                "filter": number_filter,
                 "valueFormatter": {"function":
                                    "d3.format('($,.2f')(params.value)"},
             })
         elif "area" in col:
             output.append({
                 "field": col, "sortable": True, 'width': 120, 'maxWidth': 120,
+                "filter": number_filter,
                 "valueFormatter": {"function":
                                    "d3.format('(,.2f')(params.value)"},
             })
@@ -165,391 +453,315 @@ def grid_format(table: pl.DataFrame):
 
 def df_filter(month, town, flat, area_type, max_area, min_area, price_type,
               max_price, min_price, min_lease, max_lease, street,
-              selected_mths, data_json):
-    """Filter Polars DataFrame for Viz, based on inputs"""
-    df = pl.DataFrame(json.loads(data_json)).lazy()
-
-    # Conditional flags
-    flags = []
-
-    df = df.with_columns(
-        pl.col("lease").str.split("y").list.get(0).cast(
-            pl.Int32).alias('year_count')
-    )
-
-    if max_lease:
-        flags.append(
-            pl.when(pl.col("year_count") >= int(max_lease))
-            .then(True)
-            .otherwise(False)
-            .alias("max_lease_flag")
-        )
-
-    if min_lease:
-        flags.append(
-            pl.when(pl.col("year_count") <= int(min_lease))
-            .then(True)
-            .otherwise(False)
-            .alias("min_lease_flag")
-        )
-
-    flags.append(
-        pl.when(pl.col("flat").is_in(flat))
-        .then(True)
-        .otherwise(False)
-        .alias("flat_flag")
-    )
-
-    if street:
-        flags.append(
-            pl.when(pl.col("street").str.contains(street.upper()))
-            .then(True)
-            .otherwise(False)
-            .alias("street_flag")
-        )
-
-    # Conditional flags for town, price, and area
-    if town != "All":
-        flags.append(
-            pl.when(pl.col("town") == town)
-            .then(True)
-            .otherwise(False)
-            .alias("town_flag")
-        )
-
-    if max_price:
-        flags.append(
-            pl.when(pl.col(price_type) <= max_price)
-            .then(True)
-            .otherwise(False)
-            .alias("max_price_flag")
-        )
-
-    if min_price:
-        flags.append(
-            pl.when(pl.col(price_type) >= min_price)
-            .then(True)
-            .otherwise(False)
-            .alias("min_price_flag")
-        )
-
-    if max_area:
-        flags.append(
-            pl.when(pl.col(area_type) <= max_area)
-            .then(True)
-            .otherwise(False)
-            .alias("max_area_flag")
-        )
-
-    if min_area:
-        flags.append(
-            pl.when(pl.col(area_type) >= min_area)
-            .then(True)
-            .otherwise(False)
-            .alias("min_area_flag")
-        )
-
-    # Filter and rounding for price and area columns
-    price_type = convert_price_area(price_type, area_type)
-
-    if area_type == 'area_sqft':
-        rd_col = [
-            pl.col('price').round(2),
-            pl.col('price_sqft').round(2),
-            pl.col('area_sqft').round(2)
-        ]
-        drop_columns = ["price_sqm", 'area_sqm']
-    else:
-        rd_col = [
-            pl.col('price').round(2),
-            pl.col('price_sqm').round(2),
-            pl.col('area_sqm').round(2)
-        ]
-        drop_columns = ['price_sqft', "area_sqft"]
-
-    return df.with_columns(rd_col + flags).drop(drop_columns).collect()
-
-app.layout = html.Div([
-    html.Div(
-        id="data-store",
-        style={"display": "none"},
-        children=df.write_json(),
-    ),
-    dcc.Store(id='filtered-data'),
-    html.H3(
-        children="These are Homes, Truly",
-        style={'font-weight': 'bold', 'font-size': '26px'},
-        className="mb-4 pt-4 px-4",
-    ),
-    dcc.Markdown(
-        """
-        Explore Singapore's most recent past public housing transactions
-        effortlessly with our site! Updated daily with data from data.gov.sg,
-        our tool allows you access to the latest information public housing
-        resale data provided by HDB. Currently, the data is taken as is, and
-        may not reflect the latest public housing transactions reported by the
-        media.
-
-        I built this tool to help anyone who wants to research on the Singapore
-        public housing resale market, whether you're a prospective buyer,
-        seller, or someone just curious about how much your neighbours are
-        selling their public homes! Beyond a table of transactions, I included
-        a scatter plot to compare home prices with price per sq metre / feet
-        and a boxplot distribution of home prices or price per sq metre / feet.
-
-        **This website is best view on a desktop, because doing property
-        research on your phone will be such a pain!**
-
-        *Also, if you are interested general Singapore public housing resale
-        market trends of the past few years, visit my other dashboard @ **Public
-        Home Trends ( Above )**, where I share broader public housing resale 
-        trends, outliers and price category breakdowns.*""",
-        className="px-4",
-    ),
-    dbc.Row([
-        dbc.Col(
-            dbc.Button(
-                "Filters",
-                id="collapse-button",
-                className="mb-3",
-                color="danger",
-                n_clicks=0,
-                style={"verticalAlign": "top"}
-            ),
-            width="auto"
-        ),
-        dbc.Col(
-            dcc.Loading([
-                html.P(
-                    id="dynamic-text",
-                    style={"textAlign": "center", "padding-top": "10px"}
-                )], type="circle", color="rgb(220, 38, 38)"),
-            width="auto"
+              data_version):
+    """ Filter the registered dataset for Viz, based on inputs """
+    # Windows longer than the live snapshot come from the full history
+    if history is not None and month and \
+            int(month) > len(registry.snapshot(data_version).months):
+        data_version = history_window(int(month), town or "All")
+    return filter_engine.run(FilterParams.from_inputs(
+        data_version, town, flat, area_type, price_type, min_area, max_area,
+        min_price, max_price, min_lease, max_lease, street, month))
+
+
+def serve_layout():
+    """ Built per page load so each visitor gets the current snapshot """
+    snapshot = registry.current
+    return html.Div([
+        html.Div(
+            id="data-store",
+            style={"display": "none"},
+            children=snapshot.version,
         ),
-        dbc.Col(
-            dbc.Button(
-                "Caveats",
-                id="collapse-caveats",
-                className="mb-3",
-                color="danger",
-                n_clicks=0,
-                style={"verticalAlign": "top"}
-            ),
-            width="auto"
+        dcc.Store(id='filtered-data'),
+        dcc.Store(id='g0-figure'),
+        dcc.Store(id='g2-figure'),
+        dcc.Store(id='price-table-block'),
+        html.H3(
+            children="These are Homes, Truly",
+            style={'font-weight': 'bold', 'font-size': '26px'},
+            className="mb-4 pt-4 px-4",
         ),
-    ], justify="center"),
-    dbc.Collapse(
-        dbc.Card(
-            dbc.CardBody([
-                dcc.Markdown("""
-                1. Area provided by HDB is in square metres. Calculations for
-                square feet are done by taking square metres by 10.7639.
-                2. Lease left is calculated from remaining lease provided by HDB.
-                3. Data is taken from HDB as is. This data source seems
-                slower that transactions reported in the media.
-                4. Information provided here is only for research, and
-                shouldn't be seen as financial advice.""")
-            ], style={"textAlign": "left", "color": "#555", "padding": "5px"}),
+        dcc.Markdown(
+            """
+            Explore Singapore's most recent past public housing transactions
+            effortlessly with our site! Updated daily with data from data.gov.sg,
+            our tool allows you access to the latest information public housing
+            resale data provided by HDB. Currently, the data is taken as is, and
+            may not reflect the latest public housing transactions reported by the
+            media.
+
+            I built this tool to help anyone who wants to research on the Singapore
+            public housing resale market, whether you're a prospective buyer,
+            seller, or someone just curious about how much your neighbours are
+            selling their public homes! Beyond a table of transactions, I included
+            a scatter plot to compare home prices with price per sq metre / feet
+            and a boxplot distribution of home prices or price per sq metre / feet.
+
+            **This website is best view on a desktop, because doing property
+            research on your phone will be such a pain!**
+
+            *Also, if you are interested general Singapore public housing resale
+            market trends of the past few years, visit my other dashboard @ **Public
+            Home Trends ( Above )**, where I share broader public housing resale 
+            trends, outliers and price category breakdowns.*""",
+            className="px-4",
         ),
-        id="caveats",
-        is_open=False,
-    ),
-    dbc.Collapse(
-        dbc.Card(dbc.CardBody([
-            html.Div([
-                html.Div([
-                    html.Label("Months"),
-                    dcc.Dropdown(options=[3, 6], value=6, id="month")
-                ], style={"display": "inline-block",
-                          "width": "7%", "padding": "10px"},
-                ),
-                html.Div([
-                    html.Label("Town"),
-                    html.Div(dcc.Dropdown(
-                        options=towns, value="All", id="town")),
-                ], style={"display": "inline-block",
-                          "width": "18%", "padding": "10px"},
+        dbc.Row([
+            dbc.Col(
+                dbc.Button(
+                    "Filters",
+                    id="collapse-button",
+                    className="mb-3",
+                    color="danger",
+                    n_clicks=0,
+                    style={"verticalAlign": "top"}
                 ),
-                html.Div([
-                    html.Label("Flat"),
-                    dcc.Dropdown(multi=True, options=final_flat_type_grps,
-                                 value=flat_type_grps,
-                                 id="flat"),
-                ], style={"display": "inline-block",
-                          "width": "40%", "padding": "10px"},
-                ),
-                html.Div([
-                    html.Label("Min Lease [Yrs]"),
-                    dcc.Input(type="number",
-                              placeholder="Add No.",
-                              style={"display": "flex",
-                                     "border-color": "#E5E4E2",
-                                     "padding": "5px"},
-                              id="min_lease"),
-                ], style={"display": "flex",  "flexDirection": "column",
-                          "width": "12%", "padding": "10px",
-                          "verticalAlign": "top"}),
-                html.Div([
-                    html.Label("Max Lease [Yrs]"),
-                    dcc.Input(type="number",
-                              placeholder="Add No.",
-                              style={"display": "flex",
-                                     "border-color": "#E5E4E2",
-                                     "padding": "5px"},
-                              id="max_lease"),
-                ], style={"display": "flex",  "flexDirection": "column",
-                          "width": "12%", "padding": "10px",
-                          "verticalAlign": "top"},
-                )
-            ], style={"display": "flex", "flexDirection": "row",
-                      "alignItems": "center"}
+                width="auto"
             ),
-            # Area inputs
-            html.Div([
-                html.Div([
-                    html.Label("Sq Feet | Sq M"),
-                    html.Div(dcc.Dropdown(options=[
-                        {'label': 'Sq Feet', 'value': 'area_sqft'},
-                        {'label': 'Sq M', 'value': 'area_sqm'},
-                        ], value="area_sqft", id="area_type")),
-                ], style={"display": "flex", "flexDirection": "column",
-                          "width": "12%", "padding": "10px"},
-                ),
-                html.Div([
-                    html.Label("Min Area"),
-                    dcc.Input(type="number",
-                              placeholder="Add No.",
-                              style={"display": "inline-block",
-                                     "border-color": "#E5E4E2",
-                                     "padding": "5px"},
-                              id="min_area"),
-                ], style={"display": "flex",  "flexDirection": "column",
-                          "width": "12%", "padding": "5px"},
-                ),
-                html.Div([
-                    html.Label("Max Area"),
-                    dcc.Input(type="number",
-                              placeholder="Add No.",
-                              style={"display": "inline-block",
-                                     "border-color": "#E5E4E2",
-                                     "padding": "5px"},
-                              id="max_area"),
-                ], style={"display": "flex", "flexDirection": "column",
-                          "width": "12%", "padding": "5px"},
+            dbc.Col(
+                dcc.Loading([
+                    html.P(
+                        id="dynamic-text",
+                        style={"textAlign": "center", "padding-top": "10px"}
+                    )], type="circle", color="rgb(220, 38, 38)"),
+                width="auto"
+            ),
+            dbc.Col(
+                dbc.Button(
+                    "Caveats",
+                    id="collapse-caveats",
+                    className="mb-3",
+                    color="danger",
+                    n_clicks=0,
+                    style={"verticalAlign": "top"}
                 ),
+                width="auto"
+            ),
+        ], justify="center"),
+        dbc.Collapse(
+            dbc.Card(
+                dbc.CardBody([
+                    dcc.Markdown("""
+                    1. Area provided by HDB is in square metres. Calculations for
+                    square feet are done by taking square metres by 10.7639.
+                    2. Lease left is calculated from remaining lease provided by HDB.
+                    3. Data is taken from HDB as is. This data source seems
+                    slower that transactions reported in the media.
+                    4. Information provided here is only for research, and
+                    shouldn't be seen as financial advice.""")
+                ], style={"textAlign": "left", "color": "#555", "padding": "5px"}),
+            ),
+            id="caveats",
+            is_open=False,
+        ),
+        dbc.Collapse(
+            dbc.Card(dbc.CardBody([
                 html.Div([
-                    html.Label("Price | Price / Area"),
-                    dcc.Dropdown(options=[
-                        {"label": 'Price', "value": 'price'},
-                        {"label": "Price / Area", "value": 'price_area'}
-                    ], value="price", id="price_type"),
-                ], style={"display": "flex", "flexDirection": "column",
-                          "width": "14%", "padding": "5px"},
+                    html.Div([
+                        html.Label("Months"),
+                        dcc.Dropdown(options=month_options(), value=6,
+                                     id="month")
+                    ], style={"display": "inline-block",
+                              "width": "7%", "padding": "10px"},
+                    ),
+                    html.Div([
+                        html.Label("Town"),
+                        html.Div(dcc.Dropdown(
+                            options=["All"] + snapshot.towns, value="All",
+                            id="town")),
+                    ], style={"display": "inline-block",
+                              "width": "18%", "padding": "10px"},
+                    ),
+                    html.Div([
+                        html.Label("Flat"),
+                        dcc.Dropdown(multi=True,
+                                     options=flat_options(snapshot.flat_types),
+                                     value=snapshot.flat_types,
+                                     id="flat"),
+                    ], style={"display": "inline-block",
+                              "width": "40%", "padding": "10px"},
+                    ),
+                    html.Div([
+                        html.Label("Min Lease [Yrs]"),
+                        dcc.Input(type="number",
+                                  placeholder="Add No.",
+                                  style={"display": "flex",
+                                         "border-color": "#E5E4E2",
+                                         "padding": "5px"},
+                                  id="min_lease"),
+                    ], style={"display": "flex",  "flexDirection": "column",
+                              "width": "12%", "padding": "10px",
+                              "verticalAlign": "top"}),
+                    html.Div([
+                        html.Label("Max Lease [Yrs]"),
+                        dcc.Input(type="number",
+                                  placeholder="Add No.",
+                                  style={"display": "flex",
+                                         "border-color": "#E5E4E2",
+                                         "padding": "5px"},
+                                  id="max_lease"),
+                    ], style={"display": "flex",  "flexDirection": "column",
+                              "width": "12%", "padding": "10px",
+                              "verticalAlign": "top"},
+                    )
+                ], style={"display": "flex", "flexDirection": "row",
+                          "alignItems": "center"}
                 ),
+                # Area inputs
                 html.Div([
-                    html.Label("Min Price | Price / Area"),
-                    dcc.Input(type="number",
-                              placeholder="Add No.",
-                              style={"display": "inline-block",
-                                     "border-color": "#E5E4E2",
-                                     "padding": "5px"},
-                              id="min_price"),
-                ], style={"display": "flex", "flexDirection": "column",
-                          "width": "15%", "padding": "5px"},
-                ),
+                    html.Div([
+                        html.Label("Sq Feet | Sq M"),
+                        html.Div(dcc.Dropdown(options=[
+                            {'label': 'Sq Feet', 'value': 'area_sqft'},
+                            {'label': 'Sq M', 'value': 'area_sqm'},
+                            ], value="area_sqft", id="area_type")),
+                    ], style={"display": "flex", "flexDirection": "column",
+                              "width": "12%", "padding": "10px"},
+                    ),
+                    html.Div([
+                        html.Label("Min Area"),
+                        dcc.Input(type="number",
+                                  placeholder="Add No.",
+                                  style={"display": "inline-block",
+                                         "border-color": "#E5E4E2",
+                                         "padding": "5px"},
+                                  id="min_area"),
+                    ], style={"display": "flex",  "flexDirection": "column",
+                              "width": "12%", "padding": "5px"},
+                    ),
+                    html.Div([
+                        html.Label("Max Area"),
+                        dcc.Input(type="number",
+                                  placeholder="Add No.",
+                                  style={"display": "inline-block",
+                                         "border-color": "#E5E4E2",
+                                         "padding": "5px"},
+                                  id="max_area"),
+                    ], style={"display": "flex", "flexDirection": "column",
+                              "width": "12%", "padding": "5px"},
+                    ),
+                    html.Div([
+                        html.Label("Price | Price / Area"),
+                        dcc.Dropdown(options=[
+                            {"label": 'Price', "value": 'price'},
+                            {"label": "Price / Area", "value": 'price_area'}
+                        ], value="price", id="price_type"),
+                    ], style={"display": "flex", "flexDirection": "column",
+                              "width": "14%", "padding": "5px"},
+                    ),
+                    html.Div([
+                        html.Label("Min Price | Price / Area"),
+                        dcc.Input(type="number",
+                                  placeholder="Add No.",
+                                  style={"display": "inline-block",
+                                         "border-color": "#E5E4E2",
+                                         "padding": "5px"},
+                                  id="min_price"),
+                    ], style={"display": "flex", "flexDirection": "column",
+                              "width": "15%", "padding": "5px"},
+                    ),
+                    html.Div([
+                        html.Label("Max Price | Price / Area"),
+                        dcc.Input(type="number",
+                                  style={"display": "inline-block",
+                                         "border-color": "#E5E4E2",
+                                         "padding": "5px"},
+                                  placeholder="Add No.",
+                                  id="max_price"),
+                    ], style={"display": "flex", "flexDirection": "column",
+                              "width": "15%", "padding": "5px"},
+                    ),
+                    html.Div([
+                        html.Label("Submit", style={'margin-top': '12px'}),
+                        dbc.Button('Submit', 
+                                   id='submit-button',
+                                   className="mb-3",
+                                   color="danger",
+                                   n_clicks=0,
+                                   style={"verticalAlign": "top"})
+                    ], style={"display": "flex", "flexDirection": "column",
+                              "width": "8%", "padding": "5px"},
+                    )
+                ], style={"display": "flex", "flexDirection": "row",
+                          "alignItems": "center"}),
                 html.Div([
-                    html.Label("Max Price | Price / Area"),
-                    dcc.Input(type="number",
+                    html.Label("""Search by Street 
+            ( Add | separator to include >1 street )"""),
+                    dcc.Input(type="text",
                               style={"display": "inline-block",
                                      "border-color": "#E5E4E2",
                                      "padding": "5px"},
-                              placeholder="Add No.",
-                              id="max_price"),
+                              placeholder="Type the Street Name here",
+                              id="street"),
                 ], style={"display": "flex", "flexDirection": "column",
-                          "width": "15%", "padding": "5px"},
+                          "width": "45%", "padding": "5px"},
                 ),
-                html.Div([
-                    html.Label("Submit", style={'margin-top': '12px'}),
-                    dbc.Button('Submit', 
-                               id='submit-button',
-                               className="mb-3",
-                               color="danger",
-                               n_clicks=0,
-                               style={"verticalAlign": "top"})
-                ], style={"display": "flex", "flexDirection": "column",
-                          "width": "8%", "padding": "5px"},
-                )
-            ], style={"display": "flex", "flexDirection": "row",
-                      "alignItems": "center"}),
+            ]
+            )),
+            id="collapse",
+            is_open=True,
+        ),
+        # Text box to display dynamic content
+        html.Div([
             html.Div([
-                html.Label("""Search by Street 
-        ( Add | separator to include >1 street )"""),
-                dcc.Input(type="text",
-                          style={"display": "inline-block",
-                                 "border-color": "#E5E4E2",
-                                 "padding": "5px"},
-                          placeholder="Type the Street Name here",
-                          id="street"),
-            ], style={"display": "flex", "flexDirection": "column",
-                      "width": "45%", "padding": "5px"},
+                dcc.Loading([
+                    html.Div([
+                        html.H3(
+                            "Filtered Public Housing Transactions",
+                            style={
+                                "font-size": "20px",
+                                "textAlign": "left",
+                                "margin-top": "15px",
+                                "margin-bottom": "5px",
+                            },
+                        ),
+                        dag.AgGrid(
+                            id="price-table",
+                            columnDefs=grid_format(snapshot.df),
+                            rowModelType="infinite",
+                            className="ag-theme-balham",
+                            columnSize="responsiveSizeToFit",
+                            dashGridOptions={
+                                "pagination": True,
+                                "paginationAutoPageSize": True,
+                                "cacheBlockSize": 100,
+                                "maxBlocksInCache": 10,
+                            },
+                        ),
+                    ], style={
+                        "height": 450,
+                        "width": 1200,
+                        "display": "inline-block",
+                    },
+                    )], type="circle", color="rgb(220, 38, 38)"),
+            ], style=dict(display="flex"),
             ),
-        ]
-        )),
-        id="collapse",
-        is_open=True,
-    ),
-    # Text box to display dynamic content
-    html.Div([
-        html.Div([
             dcc.Loading([
                 html.Div([
-                    html.H3(
-                        "Filtered Public Housing Transactions",
-                        style={
-                            "font-size": "20px",
-                            "textAlign": "left",
-                            "margin-top": "15px",
-                            "margin-bottom": "5px",
-                        },
-                    ),
-                    dag.AgGrid(
-                        id="price-table",
-                        columnDefs=grid_format(df),
-                        rowData=df.to_dicts(),
-                        className="ag-theme-balham",
-                        columnSize="responsiveSizeToFit",
-                        dashGridOptions={
-                            "pagination": True,
-                            "paginationAutoPageSize": True,
-                        },
-                    ),
+                    dcc.Graph(id="g0", style={"display": "inline-block", "width": "48%"}),
+                    dcc.Graph(id="g2", style={"display": "inline-block", "width": "38%"}),
                 ], style={
-                    "height": 450,
-                    "width": 1200,
-                    "display": "inline-block",
-                },
+                    "display": "flex",
+                    "justify-content": "flex-start",
+                    "width": "100%"}
                 )], type="circle", color="rgb(220, 38, 38)"),
-        ], style=dict(display="flex"),
-        ),
-        dcc.Loading([
-            html.Div([
-                dcc.Graph(id="g0", style={"display": "inline-block", "width": "48%"}),
-                dcc.Graph(id="g2", style={"display": "inline-block", "width": "38%"}),
-            ], style={
-                "display": "flex",
-                "justify-content": "flex-start",
-                "width": "100%"}
-            )], type="circle", color="rgb(220, 38, 38)")
-    ],
-        style={"display": "flex",
-               "flexDirection": "column",
-               "justifyContent": "center",
-               "alignItems": "center",
-               "minHeight": "100vh",
-               "textAlign": "center",
-               }
-    )
-])
+            dcc.Loading([
+                dcc.Graph(id="g3", style={"width": "86%"}),
+            ], type="circle", color="rgb(220, 38, 38)")
+        ],
+            style={"display": "flex",
+                   "flexDirection": "column",
+                   "justifyContent": "center",
+                   "alignItems": "center",
+                   "minHeight": "100vh",
+                   "textAlign": "center",
+                   }
+        )
+    ])
+
+
+app.layout = serve_layout
 
 
 # Standardised Dash Input-Output states
@@ -575,57 +787,80 @@ full_state = basic_state + added_state
 @callback(Output("filtered-data", "data"), 
           Input('submit-button', 'n_clicks'), 
           full_state)
+@metrics.timed
 def filtered_data(n_clicks, town, area_type, price_type, max_lease, min_lease,
                   month, flat, max_area, min_area, max_price, min_price, 
-                  street, data_json):
-
-    return df_filter(month, town, flat, area_type, max_area, min_area, 
-                     price_type, max_price, min_price, max_lease, min_lease,
-                     street, selected_mths, data_json).to_dicts()
+                  street, data_version):
+    """ Run the filter once and share its parameters with other callbacks """
+    result = df_filter(month, town, flat, area_type, max_area, min_area,
+                       price_type, max_price, min_price, min_lease, max_lease,
+                       street, data_version)
+    return result.params.to_dict()
 
 
-@callback(Output("price-table", "rowData"),
-          Output('price-table', 'columnDefs'),
+@callback(Output('price-table', 'columnDefs'),
           Input('filtered-data', 'data'),
           State('area_type', 'value'),
           State('price_type', 'value'))
+@metrics.timed
 def update_table(data, area_type, price_type):
-    """ Table output to show all searched transactions """
-    output = [{}]
-    df = pl.DataFrame(data).drop("year_count")
-    if df is not None:
-        flags = [i for i in df.columns if 'flag' in i]
-        df = df.filter(~pl.any_horizontal(pl.col('*') == False)).drop(flags)
-        output = df.to_dicts()
-        columnDefs=grid_format(df)
-    return output, columnDefs
+    """ Table columns for the searched transactions """
+    return grid_format(filter_engine.result(data).frame)
+
+
+@callback(Output("price-table-block", "data"),
+          Input("price-table", "getRowsRequest"),
+          State('filtered-data', 'data'))
+@metrics.timed
+def update_table_rows(request, data):
+    """ Serve only the block of rows the grid is displaying, column-wise """
+    if request is None or data is None:
+        return no_update
+    df = filter_engine.result(data).selected_frame.drop(typed_cols)
+    with metrics.span("rows"):
+        return get_rows(df, request)
+
+
+clientside_callback(
+    ClientsideFunction(namespace="transport", function_name="rows"),
+    Output("price-table", "getRowsResponse"),
+    Input("price-table-block", "data"))
+
+
+# Drop cached blocks so the grid asks for rows of the new search
+clientside_callback(
+    """
+    function(data) {
+        const api = dash_ag_grid.getApi("price-table");
+        if (api) { api.purgeInfiniteCache(); }
+        return "first";
+    }
+    """,
+    Output("price-table", "paginationGoTo"),
+    Input('filtered-data', 'data'),
+    prevent_initial_call=True)
 
 
 @callback(Output("dynamic-text", "children"),
           Input('filtered-data', 'data'),
           basic_state)
+@metrics.timed
 def update_text(data, town, area_type, price_type, max_lease, min_lease):
     """ Summary text for searched output """
-
-    df = pl.DataFrame(data)
-    flags = [i for i in df.columns if 'flag' in i]
-    df = df.filter(~pl.any_horizontal(pl.col('*') == False)).drop(flags)
+    result = filter_engine.result(data)
+    # Town and flat type only searches are answered from the cube
+    cube = registry.snapshot(result.params.version).cube
+    agg = cube.summary(result.params) or result.aggregates
 
     text = "<b><< YOUR SEARCH HAS NO RESULTS >></b>"
-    records = df.shape[0]
+    records = agg["records"]
     if records > 0:
-        area_min = min(df.select(area_type).to_series())
-        area_max = max(df.select(area_type).to_series())
+        area_min, area_max = agg["area_min"], agg["area_max"]
+        price_min, price_max = agg["price_min"], agg["price_max"]
 
         if price_type == 'price':
-            price_min = min(df.select(price_type).to_series())
-            price_max = max(df.select(price_type).to_series())
             price_label = 'price'
-        
         else:
-            price_type = "price_" + area_type.split('_')[-1]
-            price_min = min(df.select(price_type).to_series())
-            price_max = max(df.select(price_type).to_series())
             price_label = f"Price / {area_type.split('_')[-1]}"
 
         text = f"""<b>You searched : </b>
@@ -643,121 +878,223 @@ def update_text(data, town, area_type, price_type, max_lease, min_lease):
 
         text += f" | <b>Total records</b>: {records:,}"
 
-    print(text)
     return dcc.Markdown(text, dangerously_allow_html=True)
 
 
-@callback(Output("g0", "figure"),
-          Input('filtered-data', 'data'),
-          basic_state)
-def update_g0(data, town, area_type, price_type, max_lease, min_lease):
+def background_trace(result, x_col, y_col):
+    """ Every transaction of the snapshot, the selection included, built
+    once and drawn behind.
+
+    Past `scatter_points` rows the background is a 2-D histogram, so its
+    size no longer grows with the data. History windows scanned for one
+    town are labelled with that town.
+    """
+    key = (result.params.version, result.params.area_type, x_col, y_col)
+
+    def build():
+        towns = registry.snapshot(result.params.version).towns
+        name = towns[0] if len(towns) == 1 else 'All SG'
+        points = result.frame.select(
+            pl.col(x_col, y_col).cast(pl.Float32))
+        x, y = points[x_col].to_numpy(), points[y_col].to_numpy()
+        if len(x) > scatter_points:
+            return density_trace(x, y, name)
+
+        trace = go.Scattergl(
+            mode='markers',
+            hoverinfo='skip',
+            marker={"color": "#FFC0BD", "opacity": 0.5},
+            name=name
+        ).to_plotly_json()
+        trace.update(y=encode_array(y), x=encode_array(x))
+        return trace
+
+    return figure_cache.background(key, build)
+
+
+def density_trace(x, y, name='All SG'):
+    """ Transaction counts binned into a heatmap in the background colour """
+    counts, x_centres, y_centres = density_grid(x, y)
+    trace = go.Heatmap(
+        hoverinfo='skip',
+        colorscale=[[0, "#FFE5E3"], [1, "#FF8F87"]],
+        showscale=False,
+        showlegend=True,
+        opacity=0.8,
+        name=f'{name} ({len(x):,}, binned)'
+    ).to_plotly_json()
+    trace.update(z=encode_array(np.log1p(counts)),
+                 x=encode_array(x_centres.astype(np.float32)),
+                 y=encode_array(y_centres.astype(np.float32)))
+    return trace
+
+
+def selected_trace(df, x_col, y_col, custom_cols, hovertemplate):
+    """ Selected points as typed arrays, with town and street as text
+    sent once per distinct name and expanded by the client.
+
+    Past `scatter_points` rows a sample is drawn, thinning dense clusters
+    first, and the legend keeps the exact count.
+    """
+    points = df.select(pl.col(x_col, y_col).cast(pl.Float32))
+    x, y = points[x_col].to_numpy(), points[y_col].to_numpy()
+    name = 'Selected Data'
+    if len(x) > scatter_points:
+        rows = sample_indices(x, y, scatter_points)
+        name = f'Selected Data ({len(rows):,} of {len(x):,} shown)'
+        df, x, y = df[rows], x[rows], y[rows]
+
+    trace = go.Scattergl(
+        hovertemplate=hovertemplate,
+        mode='markers',
+        marker={"color": "rgb(220, 38, 38)", "opacity": 0.9},
+        name=name
+    ).to_plotly_json()
+    trace.update(
+        y=encode_array(y),
+        x=encode_array(x),
+        customdata=encode_array(
+            df.select(pl.col(custom_cols).cast(pl.Float32)).to_numpy()),
+        text=encode_labels(df["town"].to_numpy()),
+        hovertext=encode_labels(df["street"].to_numpy()),
+    )
+    return trace
+
+
+def build_g0(result):
     """ Scatter Plot of Price to Price / Sq Area """
+    df = result.selected_frame
+    area_type = result.params.area_type
+    price_label = 'price_sqm' if area_type == 'area_sqm' else 'price_sqft'
+
     fig = go.Figure()
-    df = pl.DataFrame(data)
-
-    if df is not None:
-        flags = [i for i in df.columns if 'flag' in i]
-        non_df = df.filter(pl.any_horizontal(pl.col('*') == False)).drop(flags)
-        df = df.filter(~pl.any_horizontal(pl.col('*') == False)).drop(flags)
-
-        price_type = convert_price_area(price_type, area_type)
-        price_label = 'price_sqm' if area_type == 'area_sqm' else 'price_sqft'
-
-        base_cols = ['year_count', 'town', 'street', area_type]
-        customdata_set = list(df[base_cols].to_numpy())
-
-        fig.add_trace(
-            go.Scattergl(
-                y=non_df.select('price').to_series(),
-                x=non_df.select(price_label).to_series(),
-                mode='markers',
-                hoverinfo='skip',
-                marker={"color": "#FFC0BD", "opacity": 0.5},
-                name='Rest of SG'
-            ))
-        fig.add_trace(
-            go.Scattergl(
-                y=df.select('price').to_series(),
-                x=df.select(price_label).to_series(),
-                customdata=customdata_set,
-                hovertemplate='<i>Price:</i> %{y:$,}<br>' +
-                '<i>Area:</i> %{customdata[3]:,}<br>' +
-                '<i>Price/Area:</i> %{x:$,}<br>' +
-                '<i>Town :</i> %{customdata[1]}<br>' +
-                '<i>Street Name:</i> %{customdata[2]}<br>' +
-                '<i>Lease Left:</i> %{customdata[0]}',
-                mode='markers',
-                marker={"color": "rgb(220, 38, 38)", "opacity": 0.9},
-                name='Selected Data'
-            ))
-        fig.update_layout(
-            title="<b>Home Prices vs Price / Area<b>",
-            yaxis={"title": "price", "gridcolor" :'#d3d3d3', "showspikes": True},
-            xaxis={"title": f"{price_label}", "gridcolor":'#d3d3d3', "showspikes": True},
-            width=chart_width,
-            height=chart_height,
-            legend=legend,
-            plot_bgcolor='white',
-            margin=dict(l=5,r=5)
-        )
+    fig.update_layout(
+        title="<b>Home Prices vs Price / Area<b>",
+        yaxis={"title": "price", "gridcolor" :'#d3d3d3', "showspikes": True},
+        xaxis={"title": f"{price_label}", "gridcolor":'#d3d3d3', "showspikes": True},
+        width=chart_width,
+        height=chart_height,
+        legend=legend,
+        plot_bgcolor='white',
+        margin=dict(l=5,r=5)
+    )
+    fig = fig.to_dict()
+    fig["data"] = [
+        background_trace(result, price_label, 'price'),
+        selected_trace(
+            df, price_label, 'price', ['lease_yrs', area_type],
+            '<i>Price:</i> %{y:$,.2f}<br>' +
+            '<i>Area:</i> %{customdata[1]:,.2f}<br>' +
+            '<i>Price/Area:</i> %{x:$,.2f}<br>' +
+            '<i>Town :</i> %{text}<br>' +
+            '<i>Street Name:</i> %{hovertext}<br>' +
+            '<i>Lease Left:</i> %{customdata[0]}'),
+    ]
     return fig
 
 
-@callback(Output("g2", "figure"), Input('filtered-data', 'data'), basic_state)
-def update_g2(data, town, area_type, price_type, max_lease, min_lease):
+def build_g2(result):
     """ Price to Lease Left Plot """
+    df = result.selected_frame
+    area_type = result.params.area_type
+
+    # Transform user inputs into table usable columns
+    price_type = result.params.price_col
+    price_label = 'price_sqm' if area_type == 'area_sqm' else 'price_sqft'
+
+    fig = go.Figure()
+    fig.update_layout(
+        title="<b>Home Prices vs Lease Left<b>",
+        yaxis={"title": f"{price_type}", 'gridcolor': '#d3d3d3', "showspikes": True},
+        xaxis={"title": "lease", 'gridcolor': '#d3d3d3', "showspikes": True},
+        width=chart_width,
+        height=chart_height,
+        legend=legend,
+        plot_bgcolor='white',
+        margin=dict(l=5,r=5)
+    )
+    fig = fig.to_dict()
+    fig["data"] = [
+        background_trace(result, 'lease_yrs', price_type),
+        selected_trace(
+            df, 'lease_yrs', price_type, ['price', price_label, area_type],
+            '<i>Price:</i> %{customdata[0]:$,.2f}<br>' +
+            '<i>Area:</i> %{customdata[2]:,.2f}<br>' +
+            '<i>Price/Area:</i> %{customdata[1]:$,.2f}<br>' +
+            '<i>Town :</i> %{text}<br>' +
+            '<i>Street Name:</i> %{hovertext}<br>' +
+            '<i>Lease Left:</i> %{x}'),
+    ]
+    return fig
+
+
+def build_g3(params, cube):
+    """ Monthly price distribution per flat type, from the aggregate cube """
+    price_col = params.price_col
+
     fig = go.Figure()
-    df = pl.DataFrame(data)
-
-    if df is not None:
-        flags = [i for i in df.columns if 'flag' in i]
-        non_df = df.filter(pl.any_horizontal(pl.col('*') == False)).drop(flags)
-        df = df.filter(~pl.any_horizontal(pl.col('*') == False)).drop(flags)
-
-        # Transform user inputs into table usable columns
-        price_type = convert_price_area(price_type, area_type)
-
-        price_label = 'price_sqm' if area_type == 'area_sqm' else 'price_sqft'
-        base_cols = ['price', price_label, 'town', 'street', area_type]
-        customdata_set = list(df[base_cols].to_numpy())
-        
-        fig.add_trace(
-            go.Scattergl(
-                y=non_df.select(price_type).to_series(),  # unchanged
-                x=non_df.select("year_count").to_series(),
-                mode='markers',
-                hoverinfo='skip',
-                marker={"color": "#FFC0BD", "opacity": 0.5},
-                name='Rest of SG'
+    for flat in params.flat:
+        dist = cube.distribution(price_col, params.town, flat)
+        if dist["month"]:
+            fig.add_trace(go.Box(
+                name=flat,
+                x=dist["month"],
+                q1=dist["q1"],
+                median=dist["median"],
+                q3=dist["q3"],
+                lowerfence=dist["min"],
+                upperfence=dist["max"],
             ))
+    fig.update_layout(
+        title=f"<b>Monthly {price_col} Distribution, {params.town}<b>",
+        yaxis={"title": f"{price_col}", 'gridcolor': '#d3d3d3'},
+        xaxis={"title": "month"},
+        boxmode="group",
+        width=chart_width * 2,
+        height=chart_height,
+        legend=legend,
+        plot_bgcolor='white',
+        margin=dict(l=5,r=5)
+    )
+    return fig.to_dict()
 
-        fig.add_trace(
-            go.Scattergl(
-                y=df.select(price_type).to_series(),  # unchanged
-                x=df.select('year_count').to_series(),
-                customdata=customdata_set,
-                hovertemplate='<i>Price:</i> %{customdata[0]:$,}<br>' +
-                '<i>Area:</i> %{customdata[4]:,}<br>' +
-                '<i>Price/Area:</i> %{customdata[1]:$,}<br>' +
-                '<i>Town :</i> %{customdata[2]}<br>' +
-                '<i>Street Name:</i> %{customdata[3]}<br>' +
-                '<i>Lease Left:</i> %{x}',
-                mode='markers',
-                marker={"color": "rgb(220, 38, 38)", "opacity": 0.9},
-                name="Selected Data"
-            )
-        )
-        fig.update_layout(
-            title="<b>Home Prices vs Lease Left<b>",
-            yaxis={"title": f"{price_type}", 'gridcolor': '#d3d3d3', "showspikes": True},
-            xaxis={"title": "lease", 'gridcolor': '#d3d3d3', "showspikes": True},
-            width=chart_width,
-            height=chart_height,
-            legend=legend,
-            plot_bgcolor='white',
-            margin=dict(l=5,r=5)
-        )
-    return fig
+
+@callback(Output("g0-figure", "data"),
+          Input('filtered-data', 'data'),
+          basic_state)
+@metrics.timed
+def update_g0(data, town, area_type, price_type, max_lease, min_lease):
+    """ Scatter Plot of Price to Price / Sq Area """
+    result = filter_engine.result(data)
+    return figure_cache.get(("g0", result.params.key),
+                            lambda: build_g0(result))
+
+
+@callback(Output("g2-figure", "data"), Input('filtered-data', 'data'),
+          basic_state)
+@metrics.timed
+def update_g2(data, town, area_type, price_type, max_lease, min_lease):
+    """ Price to Lease Left Plot """
+    result = filter_engine.result(data)
+    return figure_cache.get(("g2", result.params.key),
+                            lambda: build_g2(result))
+
+
+# assets/transport.js expands the town and street labels
+for graph in ("g0", "g2"):
+    clientside_callback(
+        ClientsideFunction(namespace="transport", function_name="figure"),
+        Output(graph, "figure"), Input(f"{graph}-figure", "data"))
+
+
+@callback(Output("g3", "figure"), Input('filtered-data', 'data'), basic_state)
+@metrics.timed
+def update_g3(data, town, area_type, price_type, max_lease, min_lease):
+    """ Price distribution by month and flat type, ignoring range filters """
+    params = FilterParams.from_dict(data)
+    cube = registry.snapshot(params.version).cube
+    key = ("g3", params.version, params.town, params.flat, params.price_col)
+    return figure_cache.get(key, lambda: build_g3(params, cube))
 
 @callback(
     Output("collapse", "is_open"),
@@ -0,0 +1,153 @@
+""" HDBFetcher against a local datastore_search stub """
+from __future__ import annotations
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from utils.hdb_fetch import FetchError, HDBFetcher
+from utils.http_client import SharedClient
+
+fields = ["month", "town", "resale_price"]
+
+
+def records(month, count):
+    return [{"month": month, "town": f"TOWN {i}", "resale_price": str(i)}
+            for i in range(count)]
+
+
+class Stub:
+    """ Serves pages of `data`, answering the first requests with `faults`
+    (status, headers) before any page """
+
+    def __init__(self, data: dict, total: dict | None = None,
+                 faults: list = (), next_links: bool = True):
+        self.data = data
+        self.total = total or {m: len(r) for m, r in data.items()}
+        self.faults = list(faults)
+        self.next_links = next_links
+        self.requests = []
+
+    def handle(self, handler):
+        query = parse_qs(urlparse(handler.path).query)
+        self.requests.append(query)
+        if self.faults:
+            status, headers = self.faults.pop(0)
+            handler.send_response(status)
+            for key, value in headers.items():
+                handler.send_header(key, value)
+            handler.end_headers()
+            return
+
+        month = json.loads(query["filters"][0])["month"]
+        limit = int(query["limit"][0])
+        offset = int(query.get("offset", ["0"])[0])
+        result = {"total": self.total.get(month, 0),
+                  "records": self.data.get(month, [])[offset:offset + limit]}
+        # Only the first page links onwards, later pages use the offset
+        if self.next_links and offset == 0:
+            nxt = dict(query, offset=[str(offset + limit)])
+            result["_links"] = {"next": "/api?" + "&".join(
+                f"{k}={v[0]}" for k, v in nxt.items())}
+        body = json.dumps({"result": result}).encode()
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(stub):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}/api"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+class RecordingFetcher(HDBFetcher):
+    """ Keeps the waits it would have slept and never sleeps """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = []
+
+    def _sleep_for(self, attempt, response=None):
+        self.waits.append(super()._sleep_for(attempt, response))
+        return 0
+
+
+def fetch(fetcher, period):
+    return SharedClient().run(fetcher.fetch_month(period))
+
+
+def test_pages_through_links_and_offsets_with_retries(serve):
+    stub = Stub({"2024-01": records("2024-01", 12)},
+                faults=[(429, {"Retry-After": "7"}), (503, {})])
+    fetcher = RecordingFetcher(serve(stub), fields, page_size=5,
+                               backoff=0.01)
+
+    result = fetch(fetcher, "2024-01")
+
+    assert result.df.columns == fields
+    assert result.df["town"].to_list() == [f"TOWN {i}" for i in range(12)]
+    assert (result.total, result.received) == (12, 12)
+    assert result.complete and result.completeness == 1.0
+    # Retry-After is honoured, the 5xx falls back to jittered backoff
+    assert fetcher.waits[0] == 7
+    assert 0 <= fetcher.waits[1] <= 0.02
+    # Two faults, the first page, its next link, then an offset request
+    assert len(stub.requests) == 5
+    assert stub.requests[-1]["offset"] == ["10"]
+
+
+def test_reports_incomplete_month(serve):
+    stub = Stub({"2024-02": records("2024-02", 4)}, total={"2024-02": 9},
+                next_links=False)
+    result = fetch(HDBFetcher(serve(stub), fields, page_size=3), "2024-02")
+
+    assert (result.total, result.received) == (9, 4)
+    assert not result.complete
+    assert result.completeness == pytest.approx(4 / 9)
+
+
+def test_empty_month(serve):
+    result = fetch(HDBFetcher(serve(Stub({})), fields), "2024-03")
+
+    assert result.df.shape == (0, 3)
+    assert result.complete and result.completeness == 1.0
+
+
+def test_gives_up_after_retries(serve):
+    stub = Stub({}, faults=[(502, {})] * 3)
+    fetcher = RecordingFetcher(serve(stub), fields, max_retries=2)
+
+    with pytest.raises(FetchError, match="gave up after 2 retries"):
+        fetch(fetcher, "2024-04")
+    assert len(stub.requests) == 3
+
+
+def test_client_errors_are_not_retried(serve):
+    stub = Stub({}, faults=[(404, {})])
+
+    with pytest.raises(FetchError):
+        fetch(RecordingFetcher(serve(stub), fields), "2024-05")
+    assert len(stub.requests) == 1
@@ -0,0 +1,40 @@
+""" Snapshots and aggregate cubes built from processed frames """
+from __future__ import annotations
+
+import polars as pl
+
+from utils.cube import dims, stat_cols
+from utils.filter_engine import FilterParams
+from utils.registry import Snapshot
+
+
+def frame(rows: list) -> pl.DataFrame:
+    return pl.DataFrame(rows, schema={
+        **{d: pl.String for d in dims}, **{c: pl.Float32 for c in stat_cols}},
+        orient="row")
+
+
+def test_empty_untyped_snapshot():
+    # A cold start with no stored months and no API ingests an empty frame
+    # whose columns are all Null
+    snapshot = Snapshot.from_frame(pl.DataFrame(schema=dims + stat_cols), [])
+
+    assert snapshot.towns == [] and snapshot.flat_types == []
+    summary = snapshot.cube.summary(FilterParams(snapshot.version))
+    assert summary == {"records": 0}
+
+
+def test_cube_rollups():
+    df = frame([
+        ("2024-01", "BEDOK", "3RM", 300000, 4000, 370, 75, 800),
+        ("2024-02", "BEDOK", "3RM", 320000, 4200, 390, 76, 820),
+        ("2024-02", "YISHUN", "3RM", 280000, 3900, 360, 72, 780),
+    ])
+    snapshot = Snapshot.from_frame(df, ["2024-01", "2024-02"])
+
+    everywhere = snapshot.cube.summary(FilterParams(
+        snapshot.version, flat=("3RM",)))
+    assert everywhere["records"] == 3
+    bedok = snapshot.cube.summary(FilterParams(
+        snapshot.version, town="BEDOK", flat=("3RM",), month=1))
+    assert bedok["records"] == 1
@@ -0,0 +1,174 @@
+""" Build slim chart pages under static/dist.
+
+Every Plotly page in static/img becomes a small HTML shell that loads one
+shared, content-hashed plotly.js bundle and fetches its figure from a
+compact, content-hashed JSON file. Each output also gets gzip and brotli
+variants for the static handler, which serves the slim page in place of
+the original once it is built. Run with `python -m utils.assets`, or let
+the app build it in the background on startup.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from urllib.parse import quote
+
+import plotly
+from plotly.offline import get_plotlyjs_version
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+source_dir = os.path.join("static", "img")
+dist_dir = os.path.join("static", "dist")
+manifest_name = "manifest.json"
+compress_types = (".html", ".js", ".json", ".css", ".svg")
+
+shell = """<!DOCTYPE html>
+<html><head><meta charset="utf-8">
+<script src="{bundle}"></script>
+</head><body style="margin:0"><div id="chart"></div><script>
+fetch("{figure}").then(r => r.json()).then(
+    f => Plotly.newPlot("chart", f.data, f.layout, f.config));
+</script></body></html>
+"""
+
+
+def _hash(content: bytes) -> str:
+    return hashlib.sha1(content).hexdigest()[:8]
+
+
+def extract_figure(html: str) -> dict:
+    """ data, layout and config passed to Plotly.newPlot in a saved page """
+    decoder = json.JSONDecoder()
+    pos = html.index("Plotly.newPlot(") + len("Plotly.newPlot(")
+    args = []
+    while len(args) < 4:
+        while html[pos] in " \t\r\n,":
+            pos += 1
+        value, pos = decoder.raw_decode(html, pos)
+        args.append(value)
+    _, data, layout, config = args
+    return {"data": data, "layout": layout, "config": config}
+
+
+def compact(value):
+    """ Whole-number floats written as ints, e.g. 1020000.0 -> 1020000 """
+    if isinstance(value, dict):
+        return {k: compact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [compact(v) for v in value]
+    if type(value) is float and value.is_integer() and abs(value) < 2 ** 53:
+        return int(value)
+    return value
+
+
+def precompress(path: str):
+    """ Write .gz and, when brotli is installed, .br next to `path` """
+    with open(path, "rb") as f:
+        content = f.read()
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(content, quality=11))
+
+
+def _write(root: str, name: str, content: bytes) -> str:
+    """ Write a dist file plus its variants, return its URL """
+    path = os.path.join(root, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    if path.endswith(compress_types):
+        precompress(path)
+    return "/static/dist/" + quote(name.replace(os.sep, "/"))
+
+
+def _sources() -> dict:
+    """ static-relative path -> [size, mtime] of every page to slim down """
+    sources = {}
+    for root, _, files in os.walk(source_dir):
+        for name in files:
+            if name.endswith(".html"):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                sources[os.path.relpath(path, "static")] = [
+                    stat.st_size, stat.st_mtime_ns]
+    return dict(sorted(sources.items()))
+
+
+def read_manifest() -> dict | None:
+    try:
+        with open(os.path.join(dist_dir, manifest_name)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def build() -> dict:
+    """ Rebuild static/dist from the pages in static/img """
+    tmp = dist_dir + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    js_path = os.path.join(os.path.dirname(plotly.__file__), "package_data",
+                           "plotly.min.js")
+    with open(js_path, "rb") as f:
+        bundle = f.read()
+    version = get_plotlyjs_version()
+    manifest = {
+        "plotly_version": version,
+        "plotly": _write(tmp, f"plotly-{version}.{_hash(bundle)}.min.js",
+                         bundle),
+        "sources": _sources(),
+        "pages": {},
+    }
+
+    for rel_path in manifest["sources"]:
+        with open(os.path.join("static", rel_path), encoding="utf-8") as f:
+            figure = compact(extract_figure(f.read()))
+
+        # static/img/a/b.html -> static/dist/img/a/b.html + b.<hash>.json
+        stem, _ = os.path.splitext(rel_path)
+        content = json.dumps(figure, separators=(",", ":")).encode()
+        figure_url = _write(tmp, f"{stem}.{_hash(content)}.json", content)
+        page = shell.format(bundle=manifest["plotly"], figure=figure_url)
+        _write(tmp, rel_path, page.encode())
+        manifest["pages"][rel_path] = os.path.join("dist", rel_path)
+
+    with open(os.path.join(tmp, manifest_name), "w") as f:
+        json.dump(manifest, f, indent=2)
+    shutil.rmtree(dist_dir, ignore_errors=True)
+    os.replace(tmp, dist_dir)
+    return manifest
+
+
+def ensure_built() -> dict | None:
+    """ Build unless static/dist already matches the sources and plotly.js """
+    manifest = read_manifest()
+    if manifest is not None and \
+            manifest.get("plotly_version") == get_plotlyjs_version() and \
+            manifest.get("sources") == _sources():
+        return manifest
+    try:
+        manifest = build()
+    except OSError as e:
+        print(f"Unable to build static assets: {e}")
+        return None
+    print(f"Built {len(manifest['pages'])} slim chart pages in {dist_dir}")
+    return manifest
+
+
+def bundle_url() -> str | None:
+    """ URL of the shared plotly.js bundle, None before the first build """
+    manifest = read_manifest()
+    return manifest.get("plotly") if manifest else None
+
+
+if __name__ == "__main__":
+    ensure_built()
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import collections
+import hashlib
+import os
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+
+import yaml
+from fastapi import APIRouter, Request
+from fastapi.responses import HTMLResponse, Response
+from fastapi.templating import Jinja2Templates
+from fastapi_blog import helpers
+
+from .response_cache import etag_matches
+
+
+@dataclass(frozen=True)
+class CompiledPost:
+    """ A post's front matter with its Markdown already rendered to HTML """
+    meta: dict
+    html: str
+    digest: str
+    mtime: float
+
+
+@dataclass(frozen=True)
+class PostIndex:
+    """ Published posts, newest first, with validators for the listing """
+    posts: list
+    tags: dict
+    etag: str
+    last_modified: float
+
+
+class BlogCache:
+    """ Blog posts parsed and rendered once, then served from memory.
+
+    Each file is keyed by its mtime and size, and re-read only when those
+    change. A re-read file whose sha1 is unchanged keeps its rendered HTML,
+    so touching a post costs one read, not a Markdown render. The index of
+    published posts behind the listing pages is rebuilt only when a post
+    changes, is added or is removed.
+    """
+
+    def __init__(self, posts_dir: str = "posts",
+                 templates_dir: str = "templates"):
+        self.posts_dir = posts_dir
+        self.templates_dir = templates_dir
+        self._stats: dict[str, tuple] = {}
+        self._posts: dict[str, CompiledPost] = {}
+        self._index: PostIndex | None = None
+        self.templates_digest = hashlib.sha1(
+            self._templates_key().encode()).hexdigest()
+
+    def _compile(self, slug: str, mtime: float) -> CompiledPost:
+        path = os.path.join(self.posts_dir, f"{slug}.md")
+        with open(path, encoding="utf-8") as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw.encode()).hexdigest()
+        cached = self._posts.get(slug)
+        if cached is not None and cached.digest == digest:
+            return CompiledPost(cached.meta, cached.html, digest, mtime)
+
+        # Same split as fastapi_blog: front matter, then the post body
+        parts = raw.split("---")
+        meta = yaml.safe_load(parts[1])
+        meta["slug"] = slug
+        return CompiledPost(meta, helpers.markdown(parts[2]), digest, mtime)
+
+    def _templates_key(self) -> str:
+        """ Template names and mtimes, so a redeploy that edits them changes
+        the ETags """
+        stats = []
+        for root, _, files in os.walk(self.templates_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                stats.append(f"{path}:{os.stat(path).st_mtime_ns}")
+        return ",".join(sorted(stats))
+
+    def refresh(self) -> PostIndex:
+        """ Recompile changed posts and rebuild the index if any changed """
+        stats = {}
+        for entry in os.scandir(self.posts_dir):
+            if entry.name.endswith(".md") and entry.is_file():
+                stat = entry.stat()
+                stats[entry.name[:-3]] = (stat.st_mtime_ns, stat.st_size)
+        if self._index is not None and stats == self._stats:
+            return self._index
+
+        self._posts = {
+            slug: self._posts[slug] if self._stats.get(slug) == key
+            else self._compile(slug, key[0] / 1e9)
+            for slug, key in stats.items()
+        }
+        self._stats = stats
+
+        posts = [p for p in self._posts.values()
+                 if p.meta.get("published") is True]
+        posts.sort(key=lambda p: p.meta["date"], reverse=True)
+
+        tags = collections.Counter(
+            tag for p in posts for tag in p.meta.get("tags", []))
+        digest = hashlib.sha1(self.templates_digest.encode())
+        for p in posts:
+            digest.update(p.digest.encode())
+        self._index = PostIndex(
+            posts=posts,
+            tags=dict(tags.most_common()),
+            etag=digest.hexdigest()[:16],
+            last_modified=max((p.mtime for p in posts), default=0),
+        )
+        return self._index
+
+    def etag(self, post: CompiledPost) -> str:
+        return hashlib.sha1(
+            (self.templates_digest + post.digest).encode()).hexdigest()[:16]
+
+    def post(self, slug: str) -> CompiledPost | None:
+        """ A published post, None if missing or unpublished """
+        return next((p for p in self.refresh().posts
+                     if p.meta["slug"] == slug), None)
+
+
+def not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    """ Whether the client's validators still match, If-None-Match first """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def blog_router(templates: Jinja2Templates, cache: BlogCache,
+                favorite_post_ids: set[str] = set()) -> APIRouter:
+    """ fastapi_blog's post and listing routes, served from `cache` """
+    router = APIRouter()
+
+    def render(request: Request, name: str, context: dict, etag: str,
+               last_modified: float) -> Response:
+        # Validators come from the post digests, so a 304 skips rendering
+        etag = f'"{etag}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache",
+                   "Last-Modified": formatdate(last_modified, usegmt=True)}
+        if not_modified(request, etag, last_modified):
+            return Response(status_code=304, headers=headers)
+        html = templates.get_template(name).render(
+            {"request": request, **context})
+        return HTMLResponse(html, headers=headers)
+
+    @router.get("/")
+    async def blog_index(request: Request):
+        index = cache.refresh()
+        posts = [p.meta for p in index.posts]
+        return render(request, "index.html", {
+            "recent_3": posts[:3],
+            "favorite_posts": [p for p in posts
+                               if p["slug"] in favorite_post_ids],
+        }, index.etag, index.last_modified)
+
+    @router.get("/posts/{post_id}")
+    async def blog_post(post_id: str, request: Request):
+        post = cache.post(post_id)
+        if post is None:
+            return templates.TemplateResponse(
+                request=request, name="404.html", status_code=404)
+        return render(request, "post.html",
+                      {"post": {**post.meta, "content": post.html}},
+                      cache.etag(post), post.mtime)
+
+    @router.get("/posts")
+    async def blog_posts(request: Request):
+        index = cache.refresh()
+        return render(request, "posts.html",
+                      {"posts": [p.meta for p in index.posts]},
+                      index.etag, index.last_modified)
+
+    @router.get("/tags")
+    async def blog_tags(request: Request):
+        index = cache.refresh()
+        return render(request, "tags.html", {"tags": index.tags},
+                      index.etag, index.last_modified)
+
+    @router.get("/tags/{tag_id}")
+    async def blog_tag(tag_id: str, request: Request):
+        index = cache.refresh()
+        posts = [p.meta for p in index.posts
+                 if tag_id in p.meta.get("tags", [])]
+        return render(request, "tag.html", {"tag_id": tag_id, "posts": posts},
+                      index.etag, index.last_modified)
+
+    return router
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+
+import httpx
+
+from .http_client import SharedClient, http_client
+
+
+@dataclass
+class ChartEntry:
+    """ A cached chart fragment and the validators needed to revalidate it """
+    body: str
+    etag: str | None
+    fetched_at: float
+
+
+class ChartCache:
+    """ In-memory cache of chart HTML fragments, kept fresh over HTTP.
+
+    Entries younger than `ttl` are served as is. Entries between `ttl` and
+    `max_stale` are served immediately while a background revalidation runs
+    ( stale-while-revalidate ). Entries older than `max_stale` are evicted and
+    must be fetched again before they can be served.
+    """
+
+    def __init__(self, urls: dict, ttl: float = 3600, max_stale: float = 86400,
+                 timeout: float = 10.0, client: SharedClient = http_client):
+        self.urls = urls
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.timeout = timeout
+        self._entries: dict[str, ChartEntry] = {}
+        self.client = client
+        self._refreshing: asyncio.Task | None = None
+
+    async def close(self):
+        if self._refreshing is not None and not self._refreshing.done():
+            self._refreshing.cancel()
+
+    def _evict_expired(self, now: float):
+        for name, entry in list(self._entries.items()):
+            if now - entry.fetched_at > self.max_stale:
+                del self._entries[name]
+
+    async def _fetch_one(self, name: str):
+        """ Fetch a single fragment, revalidating with If-None-Match """
+        headers = {}
+        cached = self._entries.get(name)
+        if cached is not None and cached.etag:
+            headers["If-None-Match"] = cached.etag
+
+        resp = await self.client.get(self.urls[name], headers=headers,
+                                     timeout=self.timeout)
+        if resp.status_code == 304 and cached is not None:
+            cached.fetched_at = time.monotonic()
+            return
+
+        resp.raise_for_status()
+        self._entries[name] = ChartEntry(
+            body=resp.text,
+            etag=resp.headers.get("etag"),
+            fetched_at=time.monotonic())
+
+    async def refresh(self, names: list | None = None):
+        """ Fetch all ( or the given ) fragments concurrently """
+        names = list(self.urls) if names is None else names
+        results = await asyncio.gather(
+            *[self._fetch_one(name) for name in names], return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors and len(errors) == len(names):
+            raise errors[0]
+
+    def _refresh_in_background(self, names: list):
+        """ Start a revalidation unless one is already running """
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(
+                self._quiet_refresh(names))
+
+    async def _quiet_refresh(self, names: list):
+        try:
+            await self.refresh(names)
+        except (httpx.HTTPError, asyncio.TimeoutError):
+            # Keep serving the stale copies until the next attempt
+            pass
+
+    async def warm_up(self):
+        """ Fill the cache ahead of the first page view """
+        await self._quiet_refresh(list(self.urls))
+
+    async def get_all(self) -> dict:
+        """ Return every fragment, only blocking on ones never fetched """
+        now = time.monotonic()
+        self._evict_expired(now)
+
+        missing = [n for n in self.urls if n not in self._entries]
+        if missing:
+            await self.refresh(missing)
+            missing = [n for n in self.urls if n not in self._entries]
+            if missing:
+                raise httpx.HTTPError(f"Unable to fetch {', '.join(missing)}")
+
+        stale = [n for n, e in self._entries.items()
+                 if now - e.fetched_at > self.ttl]
+        if stale:
+            self._refresh_in_background(stale)
+
+        return {name: self._entries[name].body for name in self.urls}
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import polars as pl
+
+dims = ['month', 'town', 'flat']
+stat_cols = ['price', 'price_sqm', 'price_sqft', 'area_sqm', 'area_sqft']
+stats = ['min', 'q1', 'median', 'q3', 'max']
+ALL = "All"
+
+
+def stat_exprs(cols: list = stat_cols) -> list:
+    """ Count plus five-number summary of each column """
+    exprs = [pl.len().cast(pl.Int64).alias("count")]
+    for c in cols:
+        value = pl.col(c)
+        exprs += [
+            value.min().alias(f"{c}_min"),
+            value.quantile(0.25, "linear").alias(f"{c}_q1"),
+            value.median().alias(f"{c}_median"),
+            value.quantile(0.75, "linear").alias(f"{c}_q3"),
+            value.max().alias(f"{c}_max"),
+        ]
+    return exprs
+
+
+class AggregateCube:
+    """ Month x town x flat type statistics, computed once per snapshot.
+
+    Besides the full month x town x flat cells the cube holds rollups with
+    month and/or town set to "All", so quantiles and medians are exact for
+    every combination the dashboard asks for. Lookups are dictionary hits
+    and never touch the transaction rows.
+    """
+
+    def __init__(self, frame: pl.DataFrame):
+        self.frame = frame
+        self.cells = {tuple(row[d] for d in dims): row
+                      for row in frame.iter_rows(named=True)}
+        self.months = sorted({m for m, _, _ in self.cells if m != ALL})
+
+    @classmethod
+    def from_frame(cls, df: pl.DataFrame):
+        # Statistics of the rounded values the table and summary display.
+        # Dimensions are cast so an empty, untyped frame still concatenates
+        # with the "All" rollups.
+        df = df.select(pl.col(dims).cast(pl.String), *[
+            pl.col(c).cast(pl.Float64).round(2) for c in stat_cols])
+        parts = []
+        for group in (dims, ['town', 'flat'], ['month', 'flat'], ['flat']):
+            part = df.group_by(group).agg(stat_exprs()).with_columns(
+                [pl.lit(ALL).alias(d) for d in dims if d not in group])
+            parts.append(part.select(pl.col(dims), pl.exclude(dims)))
+        return cls(pl.concat(parts).sort(dims))
+
+    def cell(self, month: str, town: str, flat: str) -> dict | None:
+        return self.cells.get((month, town, flat))
+
+    @staticmethod
+    def covers(params) -> bool:
+        """ Whether a filter only selects on months, town and flat type """
+        return params.street is None and not any([
+            params.min_area, params.max_area, params.min_price,
+            params.max_price, params.min_lease, params.max_lease])
+
+    def summary(self, params) -> dict | None:
+        """ Same figures as FilterResult.aggregates, None if not covered """
+        if not self.covers(params):
+            return None
+
+        # Counts, minimums and maximums add up across single months
+        months = [ALL]
+        if params.month and params.month < len(self.months):
+            months = self.months[-params.month:]
+        cells = [c for c in (self.cell(m, params.town, f)
+                             for m in months for f in params.flat)
+                 if c is not None]
+        agg = {"records": sum(c["count"] for c in cells)}
+        if agg["records"]:
+            price_col = 'price' if params.price_type == 'price' \
+                else params.price_col
+            agg.update(
+                area_min=min(c[f"{params.area_type}_min"] for c in cells),
+                area_max=max(c[f"{params.area_type}_max"] for c in cells),
+                price_min=min(c[f"{price_col}_min"] for c in cells),
+                price_max=max(c[f"{price_col}_max"] for c in cells),
+            )
+        return agg
+
+    def distribution(self, col: str, town: str, flat: str) -> dict:
+        """ Monthly five-number summaries of `col` for one town and flat """
+        cells = [(m, self.cell(m, town, flat)) for m in self.months]
+        cells = [(m, c) for m, c in cells if c is not None]
+        out = {"month": [m for m, _ in cells],
+               "count": [c["count"] for _, c in cells]}
+        for stat in stats:
+            out[stat] = [c[f"{col}_{stat}"] for _, c in cells]
+        return out
@@ -1,5 +1,26 @@
-import pandas as pd
+from __future__ import annotations
+
+import weakref
+from collections import OrderedDict
+
 import numpy as np
+import polars as pl
+
+from .spatial import SpatialIndex, haversine
+
+try:
+    import pandas as pd
+except ImportError:  # Only needed for the pandas backend
+    pd = None
+
+# Raw HDB flat type -> short label, room suffix filled in per caller
+flat_replacements = [
+    (" ROOM", "{room}"),
+    ("EXECUTIVE", "EC"),
+    ("MULTI-GENERATION", "MG"),
+]
+lease_year_pattern = r"(\d+) year"
+lease_month_pattern = r"(\d+) month"
 
 
 def create_mdb_query_w_df_cols(df: pd.DataFrame):
@@ -8,7 +29,7 @@ def create_mdb_query_w_df_cols(df: pd.DataFrame):
     list or string of known column names
     """
 
-    if type(df) is pd.DataFrame:
+    if pd is not None and type(df) is pd.DataFrame:
         col_names = df.columns.tolist()
     elif type(df) is list:
         col_names = df
@@ -25,36 +46,133 @@ def create_mdb_query_w_df_cols(df: pd.DataFrame):
     return col_dict, col_filter
 
 
-def process_df_lease_left(df: pd.DataFrame) -> pd.DataFrame:
-    """ Process """
-    if 'lease_left' in df.columns.tolist():
-        df['lease_left'] = [i.replace('s', '') for i in df['lease_left']]
-        df['lease_left'] = [i.replace(' year', 'y') for i in df['lease_left']]
-        df['lease_left'] = [i.replace(' month', 'm') for i in df['lease_left']]
+# Polars expressions, shared with the public housing ingest pipeline
+def lease_years_expr(col: str) -> pl.Expr:
+    """ Whole years left from '61 years 04 months' """
+    return pl.col(col).str.extract(lease_year_pattern, 1).cast(pl.Int16)
+
+
+def lease_months_expr(col: str) -> pl.Expr:
+    """ Total months left from '61 years 04 months' """
+    months = pl.col(col).str.extract(
+        lease_month_pattern, 1).cast(pl.Int16).fill_null(0)
+    return lease_years_expr(col) * 12 + months
 
-        df['lease_yrs'] = [
-            int(i[0])*12 for i in df['lease_left'].str.split("y")]
 
-        df['lease_mths'] = [0 if i[-1].strip().replace('m', '') == '' else int(
-            i[-1].strip().replace('m', '')) for i in df['lease_left'].str.split("y")]
+def lease_label_expr(col: str) -> pl.Expr:
+    """ '61 years 04 months' -> '61y 04m' """
+    return (pl.col(col)
+            .str.replace("s", "")
+            .str.replace(" year", "y")
+            .str.replace(" month", "m"))
 
-        df['total_lease'] = df['lease_yrs'] + df['lease_mths']
 
-        del df['lease_left']
-        del df['lease_yrs']
-        del df['lease_mths']
+def flat_expr(col: str, room: str = "R") -> pl.Expr:
+    """ '4 ROOM' -> '4R', 'EXECUTIVE' -> 'EC', 'MULTI-GENERATION' -> 'MG' """
+    expr = pl.col(col)
+    for old, new in flat_replacements:
+        expr = expr.str.replace(old, new.format(room=room), literal=True)
+    return expr
 
-        df.rename(columns={'total_lease': 'lease_mths'}, inplace=True)
-        df['lease_mths'] = df['lease_mths'].astype(np.int32)
+
+def process_df_lease_left(df: pd.DataFrame | pl.DataFrame):
+    """ Replace 'lease_left' text with total months left as 'lease_mths' """
+    if 'lease_left' not in df.columns:
+        return df
+
+    if isinstance(df, pl.DataFrame):
+        return df.with_columns(
+            lease_months_expr('lease_left').cast(pl.Int32).alias('lease_mths')
+        ).drop('lease_left')
+
+    lease = df['lease_left'].astype(str)
+    years = lease.str.extract(lease_year_pattern, expand=False)
+    months = lease.str.extract(lease_month_pattern, expand=False)
+    df['lease_mths'] = (years.astype(np.int32) * 12
+                        + months.fillna(0).astype(np.int32)).astype(np.int32)
+    del df['lease_left']
 
     return df
 
 
-def process_df_flat(df: pd.DataFrame) -> pd.DataFrame:
-    if "flat" in df.columns.tolist():
-        df['flat'] = [i.replace(" ROOM", "R") for i in df['flat']]
-        df['flat'] = [i.replace("EXECUTIVE", "EC") for i in df['flat']]
-        df['flat'] = [i.replace("MULTI-GENERATION", "MG") for i in df['flat']]
-        df['flat'] = df['flat'].astype(str)
+def process_df_flat(df: pd.DataFrame | pl.DataFrame, room: str = "R"):
+    """ Shorten flat type labels """
+    if "flat" not in df.columns:
+        return df
+
+    if isinstance(df, pl.DataFrame):
+        return df.with_columns(flat_expr("flat", room).alias("flat"))
+
+    flat = df['flat'].astype(str)
+    for old, new in flat_replacements:
+        flat = flat.str.replace(old, new.format(room=room), regex=False)
+    df['flat'] = flat
 
     return df
+
+
+# Location map: nearest stations and amenities around a searched point
+_spatial_indexes: OrderedDict = OrderedDict()
+max_spatial_indexes = 8
+
+
+def spatial_index(df: pd.DataFrame | pl.DataFrame) -> SpatialIndex:
+    """ SpatialIndex over a frame's LATITUDE / LONGITUDE, built once.
+
+    Indexes are keyed by the frame's identity and length, so a lookup
+    never reads the coordinates. An entry is dropped when its frame is
+    garbage collected, so no frame is kept alive and ids are not reused.
+    """
+    key = (id(df), len(df))
+    index = _spatial_indexes.get(key)
+    if index is None:
+        index = SpatialIndex(df['LATITUDE'], df['LONGITUDE'])
+        _spatial_indexes[key] = index
+        weakref.finalize(df, _spatial_indexes.pop, key, None)
+        while len(_spatial_indexes) > max_spatial_indexes:
+            _spatial_indexes.popitem(last=False)
+    else:
+        _spatial_indexes.move_to_end(key)
+    return index
+
+
+def table_select_from_pt(df: pd.DataFrame | pl.DataFrame, search_pt: tuple,
+                         radius: float = 1000,
+                         index: SpatialIndex | None = None):
+    """ Rows within `radius` metres of (lat, lon), nearest first, with
+    their straight-line 'distance'.
+
+    Pass the frame's own `index` to skip the shared cache lookup.
+    """
+    index = spatial_index(df) if index is None else index
+    rows, distance = index.query_radius(*search_pt, radius)
+
+    if isinstance(df, pl.DataFrame):
+        return df[rows].with_columns(pl.Series('distance', distance))
+
+    out = df.iloc[rows].reset_index(drop=True)
+    out['distance'] = distance
+    return out
+
+
+def create_routes(start: tuple, lats, lons):
+    """ Walking routes from `start` to every (lat, lon), with lengths.
+
+    Stand-in for a routing service: each route goes along the latitude,
+    then the longitude, which tracks a street grid better than a straight
+    line does.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    lat0, lon0 = start
+    total = haversine(lat0, lon0, lats, lon0) + \
+        haversine(lats, lon0, lats, lons)
+    routes = [[(lat0, lon0), (lat, lon0), (lat, lon)]
+              for lat, lon in zip(lats.tolist(), lons.tolist())]
+    return routes, total
+
+
+def create_route(start: tuple, end: tuple):
+    """ Route points and length in metres between two (lat, lon) """
+    routes, total = create_routes(start, [end[0]], [end[1]])
+    return routes[0], float(total[0])
@@ -0,0 +1,51 @@
+import numpy as np
+
+
+def finite(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """ Positions of the points with both coordinates set """
+    return np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+
+
+def density_grid(x: np.ndarray, y: np.ndarray, bins: tuple = (120, 90)):
+    """ 2-D histogram of the points as (counts, x centres, y centres).
+
+    Counts are indexed [y, x] like a Plotly heatmap's z, with empty bins
+    set to NaN so they are not drawn.
+    """
+    keep = finite(x, y)
+    if not len(keep):
+        return np.empty((0, 0)), np.empty(0), np.empty(0)
+    counts, x_edges, y_edges = np.histogram2d(x[keep], y[keep], bins=bins)
+    counts = counts.T.astype(np.float32)
+    counts[counts == 0] = np.nan
+    return counts, (x_edges[:-1] + x_edges[1:]) / 2, \
+        (y_edges[:-1] + y_edges[1:]) / 2
+
+
+def sample_indices(x: np.ndarray, y: np.ndarray, limit: int,
+                   bins: tuple = (60, 45), seed: int = 0) -> np.ndarray:
+    """ At most `limit` point positions, sorted, favouring sparse areas.
+
+    Each point is weighted by the inverse of its bin's count and drawn by
+    weighted sampling without replacement (Efraimidis-Spirakis), so dense
+    clusters are thinned while outliers are kept. The same input always
+    gives the same sample.
+    """
+    n = len(x)
+    if n <= limit:
+        return np.arange(n)
+
+    keep = finite(x, y)
+    weights = np.full(n, 1e-9)
+    if len(keep):
+        _, x_edges, y_edges = np.histogram2d(x[keep], y[keep], bins=bins)
+        xi = np.clip(np.searchsorted(x_edges, x[keep], "right") - 1,
+                     0, bins[0] - 1)
+        yi = np.clip(np.searchsorted(y_edges, y[keep], "right") - 1,
+                     0, bins[1] - 1)
+        cell = xi * bins[1] + yi
+        weights[keep] = 1 / np.bincount(cell, minlength=bins[0] * bins[1]
+                                        )[cell]
+
+    keys = np.random.default_rng(seed).random(n) ** (1 / weights)
+    return np.sort(np.argpartition(keys, n - limit)[n - limit:])
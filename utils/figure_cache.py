@@ -0,0 +1,47 @@
+import threading
+from collections import OrderedDict
+
+from .metrics import metrics
+
+
+class FigureCache:
+    """ LRU of built Plotly figure dicts keyed by a filter signature.
+
+    Background traces, which only depend on the snapshot, are memoised
+    separately so a new search only builds its selected trace.
+    """
+
+    def __init__(self, max_figures: int = 64, max_backgrounds: int = 8):
+        self.max_figures = max_figures
+        self.max_backgrounds = max_backgrounds
+        self._figures: OrderedDict = OrderedDict()
+        self._backgrounds: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _memo(self, store: OrderedDict, limit: int, key, build, stage: str):
+        with self._lock:
+            if key in store:
+                store.move_to_end(key)
+                self.hits += 1
+                return store[key]
+            self.misses += 1
+
+        with metrics.span(stage):
+            value = build()
+        with self._lock:
+            store[key] = value
+            while len(store) > limit:
+                store.popitem(last=False)
+        return value
+
+    def background(self, key, build) -> dict:
+        """ Trace dict shared by every figure of one snapshot """
+        return self._memo(self._backgrounds, self.max_backgrounds, key, build,
+                          "background")
+
+    def get(self, key, build) -> dict:
+        """ Figure dict for a filter signature, built on a miss """
+        return self._memo(self._figures, self.max_figures, key, build,
+                          "figure")
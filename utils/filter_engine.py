@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, replace
+from functools import cached_property
+
+import numpy as np
+import polars as pl
+
+from .hdb_index import DatasetIndex
+from .metrics import metrics
+
+
+def convert_price_area(price_type, area_type):
+    """ Convert user price for table ftilers Plotly labels """
+
+    if price_type != 'price':
+        price_type = 'price_sqft' if area_type == 'area_sqft' else 'price_sqm'
+
+    return price_type
+
+
+def _number(value):
+    return None if value in (None, "") else float(value)
+
+
+@dataclass(frozen=True)
+class FilterParams:
+    """ Normalised dashboard filter inputs """
+    version: str
+    town: str = "All"
+    flat: tuple = ()
+    area_type: str = "area_sqft"
+    price_type: str = "price"
+    min_area: float | None = None
+    max_area: float | None = None
+    min_price: float | None = None
+    max_price: float | None = None
+    min_lease: float | None = None
+    max_lease: float | None = None
+    street: str | None = None
+    month: int | None = None
+
+    @classmethod
+    def from_inputs(cls, version, town, flat, area_type, price_type,
+                    min_area, max_area, min_price, max_price, min_lease,
+                    max_lease, street, month=None):
+        return cls(
+            version=version,
+            town=town or "All",
+            flat=tuple(sorted(flat or [])),
+            area_type=area_type or "area_sqft",
+            price_type=price_type or "price",
+            min_area=_number(min_area),
+            max_area=_number(max_area),
+            min_price=_number(min_price),
+            max_price=_number(max_price),
+            min_lease=_number(min_lease),
+            max_lease=_number(max_lease),
+            street=street.strip().upper() if street and street.strip()
+            else None,
+            month=int(month) if month else None,
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        data = dict(data)
+        data["flat"] = tuple(data.get("flat") or ())
+        return cls(**data)
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["flat"] = list(self.flat)
+        return data
+
+    @property
+    def key(self) -> str:
+        raw = json.dumps(self.to_dict(), sort_keys=True).encode()
+        return hashlib.sha1(raw).hexdigest()[:16]
+
+    @property
+    def price_col(self) -> str:
+        return convert_price_area(self.price_type, self.area_type)
+
+
+def predicates(p: FilterParams, months: list | None = None) -> list:
+    """ Polars expressions that a row must satisfy to be selected, where
+    `months` are the dataset's months the Months dropdown counts back in """
+    exprs = [pl.col("flat").is_in(list(p.flat))]
+
+    if p.month and months and p.month < len(months):
+        exprs.append(pl.col("month").is_in(sorted(months)[-p.month:]))
+    if p.town != "All":
+        exprs.append(pl.col("town") == p.town)
+    if p.street:
+        exprs.append(pl.col("street").str.contains(p.street))
+    if p.min_lease:
+        exprs.append(pl.col("lease_yrs") >= p.min_lease)
+    if p.max_lease:
+        exprs.append(pl.col("lease_yrs") <= p.max_lease)
+    if p.min_price:
+        exprs.append(pl.col(p.price_col) >= p.min_price)
+    if p.max_price:
+        exprs.append(pl.col(p.price_col) <= p.max_price)
+    if p.min_area:
+        exprs.append(pl.col(p.area_type) >= p.min_area)
+    if p.max_area:
+        exprs.append(pl.col(p.area_type) <= p.max_area)
+
+    return exprs
+
+
+display_cols = ['price', 'price_sqft', 'area_sqft', 'price_sqm', 'area_sqm']
+
+
+def rounded_columns(df: pl.DataFrame, cols: list = display_cols):
+    """ Price and area columns rounded for display """
+    return df.select([pl.col(c).cast(pl.Float64).round(2) for c in cols])
+
+
+def display_frame(df: pl.DataFrame, area_type: str,
+                  rounded: pl.DataFrame | None = None) -> pl.DataFrame:
+    """ Rounded columns for the chosen area unit """
+    if area_type == 'area_sqft':
+        rd_col = ['price', 'price_sqft', 'area_sqft']
+        drop_columns = ["price_sqm", 'area_sqm']
+    else:
+        rd_col = ['price', 'price_sqm', 'area_sqm']
+        drop_columns = ['price_sqft', "area_sqft"]
+
+    rounded = rounded_columns(df, rd_col) if rounded is None \
+        else rounded.select(rd_col)
+    return df.with_columns(rounded).drop(drop_columns)
+
+
+@dataclass(frozen=True)
+class FilterResult:
+    """ Outcome of one filter evaluation, shared by every callback """
+    params: FilterParams
+    frame: pl.DataFrame
+    selected: np.ndarray
+
+    @property
+    def records(self) -> int:
+        return len(self.selected)
+
+    @property
+    def selected_frame(self) -> pl.DataFrame:
+        return self.frame[self.selected]
+
+    @cached_property
+    def aggregates(self) -> dict:
+        """ Record count and area / price ranges of the selected rows """
+        aggregates = {"records": self.records}
+        if self.records:
+            price_col = 'price' if self.params.price_type == 'price' \
+                else self.params.price_col
+            area_type = self.params.area_type
+            aggregates.update(self.selected_frame.select(
+                pl.col(area_type).min().alias("area_min"),
+                pl.col(area_type).max().alias("area_max"),
+                pl.col(price_col).min().alias("price_min"),
+                pl.col(price_col).max().alias("price_max"),
+            ).row(0, named=True))
+        return aggregates
+
+
+@dataclass(frozen=True)
+class VersionData:
+    """ Display frames and index of one snapshot version, cached together
+    so they always describe the same rows """
+    frames: dict
+    index: DatasetIndex | None
+
+
+class FilterEngine:
+    """ Evaluates filter predicates once per distinct query.
+
+    Results are kept in a small LRU keyed by the normalised parameters, so
+    the table, summary text and charts triggered by the same Submit all
+    reuse a single evaluation. Predicates are answered from a DatasetIndex
+    built once per snapshot version, or by a Polars scan when `use_index`
+    is off. Each version's index and display frames are kept for
+    `max_versions` versions and evicted together. `get_dataset` must
+    raise KeyError for unknown versions; `resolve_version` may redirect
+    those, e.g. a dropped version from an old browser tab, to a live one.
+    """
+
+    def __init__(self, get_dataset, max_results: int = 32,
+                 use_index: bool = True, max_versions: int = 2,
+                 resolve_version=None):
+        self.get_dataset = get_dataset
+        self.max_results = max_results
+        self.use_index = use_index
+        self.max_versions = max_versions
+        self.resolve_version = resolve_version
+        self._results: OrderedDict[str, FilterResult] = OrderedDict()
+        self._versions: OrderedDict[str, VersionData] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _memo(self, store: OrderedDict, limit: int, key, build,
+              count: bool = False):
+        with self._lock:
+            if key in store:
+                store.move_to_end(key)
+                self.hits += count
+                return store[key]
+            self.misses += count
+
+        value = build()
+        with self._lock:
+            store[key] = value
+            while len(store) > limit:
+                store.popitem(last=False)
+        return value
+
+    def _build(self, df: pl.DataFrame, index: DatasetIndex | None = None,
+               rounded: pl.DataFrame | None = None) -> VersionData:
+        if self.use_index and index is None:
+            index = DatasetIndex(df)
+        return VersionData(
+            frames={area_type: display_frame(df, area_type, rounded)
+                    for area_type in ('area_sqft', 'area_sqm')},
+            index=index if self.use_index else None)
+
+    def version_data(self, version: str) -> VersionData:
+        """ Index and display frames of a version, built on first use """
+        return self._memo(self._versions, self.max_versions, version,
+                          lambda: self._build(self.get_dataset(version)))
+
+    def index(self, version: str) -> DatasetIndex | None:
+        return self.version_data(version).index
+
+    def _display_frame(self, version: str, area_type: str) -> pl.DataFrame:
+        return self.version_data(version).frames[area_type]
+
+    def prepare(self, version: str, df: pl.DataFrame,
+                index: DatasetIndex | None = None,
+                rounded: pl.DataFrame | None = None):
+        """ Build a snapshot's index and display frames before it goes live.
+
+        A prebuilt `index` and `rounded` columns, e.g. memory-mapped from a
+        shared snapshot, are used as they are.
+        """
+        self._memo(self._versions, self.max_versions, version,
+                   lambda: self._build(df, index, rounded))
+
+    def _evaluate(self, params: FilterParams) -> FilterResult:
+        data = self.version_data(params.version)
+        frame = data.frames[params.area_type]
+        with metrics.span("filter"):
+            if data.index is not None:
+                mask = data.index.mask(params)
+            else:
+                months = frame["month"].unique().to_list()
+                mask = frame.select(pl.all_horizontal(
+                    predicates(params, months)).fill_null(False)
+                ).to_series().to_numpy()
+
+            selected = np.flatnonzero(mask).astype(np.int32)
+        return FilterResult(params=params, frame=frame, selected=selected)
+
+    def run(self, params: FilterParams) -> FilterResult:
+        if self.resolve_version is not None:
+            version = self.resolve_version(params.version)
+            if version != params.version:
+                params = replace(params, version=version)
+        return self._memo(self._results, self.max_results, params.key,
+                          lambda: self._evaluate(params), count=True)
+
+    def result(self, data: dict) -> FilterResult:
+        """ Result for the parameters held in the filtered-data store """
+        return self.run(FilterParams.from_dict(data))
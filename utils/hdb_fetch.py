@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+from dataclasses import dataclass
+from urllib.parse import urljoin
+
+import httpx
+import polars as pl
+
+from .http_client import SharedClient, http_client
+from .metrics import metrics
+
+
+class FetchError(Exception):
+    """ Raised when a month cannot be fetched after all retries """
+
+
+@dataclass
+class MonthResult:
+    """ Records fetched for one month and how complete they are """
+    period: str
+    df: pl.DataFrame
+    total: int
+    received: int
+
+    @property
+    def complete(self) -> bool:
+        return self.received >= self.total
+
+    @property
+    def completeness(self) -> float:
+        return 1.0 if self.total == 0 else self.received / self.total
+
+
+class HDBFetcher:
+    """ Paginated data.gov.sg datastore_search client on the shared client.
+
+    Pages are followed through `_links.next` until `total` records have been
+    received. Connection errors, 5xx and 429 answers are retried with jittered
+    exponential backoff, honouring Retry-After when the server sends one.
+    """
+
+    retry_status = {429, 500, 502, 503, 504}
+
+    def __init__(self, url: str, fields: list, page_size: int = 5000,
+                 max_retries: int = 5, backoff: float = 0.5,
+                 max_backoff: float = 30.0, timeout: float = 30.0,
+                 client: SharedClient = http_client):
+        self.url = url
+        self.fields = fields
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.client = client
+
+    def _sleep_for(self, attempt: int, response=None) -> float:
+        """ Seconds to wait before the next attempt """
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.max_backoff)
+        delay = min(self.backoff * 2 ** attempt, self.max_backoff)
+        return random.uniform(0, delay)
+
+    async def _get(self, url: str, params: dict | None = None) -> dict:
+        """ GET one page with retries, returning the `result` payload """
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = await self.client.get(
+                    url, params=params, timeout=self.timeout)
+                if response.status_code not in self.retry_status:
+                    response.raise_for_status()
+                    return response.json()["result"]
+                last_error = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                last_error = str(e) or type(e).__name__
+            except (httpx.HTTPStatusError, ValueError, KeyError) as e:
+                raise FetchError(f"{url}: {e}") from e
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._sleep_for(attempt, response))
+
+        raise FetchError(f"{url}: gave up after {self.max_retries} retries "
+                         f"({last_error})")
+
+    async def fetch_month(self, period: str) -> MonthResult:
+        """ Fetch every page for a month """
+        with metrics.span("fetch"):
+            return await self._fetch_month(period)
+
+    async def _fetch_month(self, period: str) -> MonthResult:
+        params = {
+            "fields": ",".join(self.fields),
+            "filters": json.dumps({"month": period}),
+            "limit": self.page_size,
+        }
+        result = await self._get(self.url, params)
+        total = result.get("total", 0)
+        records = list(result.get("records", []))
+
+        # Follow the server's next links until all records are in
+        while len(records) < total:
+            next_link = result.get("_links", {}).get("next")
+            if next_link:
+                result = await self._get(urljoin(self.url, next_link))
+            else:
+                params["offset"] = len(records)
+                result = await self._get(self.url, params)
+            page = result.get("records", [])
+            if not page:
+                break
+            records.extend(page)
+
+        df = pl.DataFrame(records, schema=self.fields) if records \
+            else pl.DataFrame(schema=self.fields)
+        return MonthResult(period=period, df=df, total=total,
+                           received=len(records))
@@ -0,0 +1,173 @@
+import os
+import re
+from collections import defaultdict
+
+import numpy as np
+import polars as pl
+
+range_cols = ['price', 'price_sqm', 'price_sqft', 'area_sqm', 'area_sqft',
+              'lease_yrs']
+
+
+class Categorical:
+    """ Dictionary-encoded string column """
+
+    def __init__(self, series: pl.Series):
+        values = series.to_numpy()
+        self.values, codes = np.unique(values, return_inverse=True)
+        self.codes = codes.astype(np.int32)
+        self.lookup = {v: i for i, v in enumerate(self.values)}
+
+    @classmethod
+    def from_arrays(cls, values: np.ndarray, codes: np.ndarray):
+        self = cls.__new__(cls)
+        self.values, self.codes = values, codes
+        self.lookup = {v: i for i, v in enumerate(self.values)}
+        return self
+
+    def mask(self, wanted) -> np.ndarray:
+        """ Rows whose value is one of `wanted` """
+        lut = np.zeros(len(self.values), dtype=bool)
+        lut[[self.lookup[v] for v in wanted if v in self.lookup]] = True
+        return lut[self.codes]
+
+    def mask_ids(self, ids) -> np.ndarray:
+        lut = np.zeros(len(self.values), dtype=bool)
+        lut[list(ids)] = True
+        return lut[self.codes]
+
+
+class SortedRange:
+    """ Sorted permutation of a numeric column for range lookups """
+
+    def __init__(self, series: pl.Series):
+        values = series.to_numpy()
+        self.order = np.argsort(values, kind="stable").astype(np.int32)
+        self.sorted = values[self.order]
+
+    @classmethod
+    def from_arrays(cls, order: np.ndarray, sorted_values: np.ndarray):
+        self = cls.__new__(cls)
+        self.order, self.sorted = order, sorted_values
+        return self
+
+    def rows(self, low=None, high=None) -> np.ndarray:
+        lo = 0 if low is None else np.searchsorted(self.sorted, low, "left")
+        hi = len(self.sorted) if high is None \
+            else np.searchsorted(self.sorted, high, "right")
+        return self.order[lo:hi]
+
+
+class NGramIndex:
+    """ Trigram index over the distinct values of a string column """
+
+    n = 3
+
+    def __init__(self, values):
+        self.values = list(values)
+        self.postings = defaultdict(set)
+        for i, value in enumerate(self.values):
+            for gram in self._grams(value):
+                self.postings[gram].add(i)
+
+    def _grams(self, text: str) -> set:
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def _contains(self, literal: str) -> set:
+        grams = self._grams(literal)
+        if not grams:
+            candidates = range(len(self.values))
+        else:
+            candidates = set.intersection(
+                *[self.postings.get(g, set()) for g in grams])
+        return {i for i in candidates if literal in self.values[i]}
+
+    def search(self, pattern: str) -> set:
+        """ Ids of values matching `pattern`, where | separates options """
+        if re.search(r"[\\^$.*+?()\[\]{}]", pattern):
+            # Regex metacharacters, check each distinct value instead
+            regex = re.compile(pattern)
+            return {i for i, v in enumerate(self.values) if regex.search(v)}
+        return set().union(*[self._contains(o) for o in pattern.split("|")])
+
+
+class DatasetIndex:
+    """ Indexes over one snapshot, built once and shared by every query.
+
+    Month, town and flat type are dictionary encoded, numeric filters use
+    sorted permutations and street search uses a trigram index over the
+    distinct street names. Predicates are answered as boolean row masks.
+    """
+
+    categorical_cols = ("month", "town", "flat", "street")
+
+    def __init__(self, df: pl.DataFrame):
+        self.size = df.shape[0]
+        self.month = Categorical(df["month"])
+        self.town = Categorical(df["town"])
+        self.flat = Categorical(df["flat"])
+        self.street = Categorical(df["street"])
+        self.street_grams = NGramIndex(self.street.values)
+        self.ranges = {c: SortedRange(df[c]) for c in range_cols}
+
+    def save(self, path: str):
+        """ Write the arrays as .npy files that `load` can memory-map """
+        arrays = {"size": np.array([self.size])}
+        for name in self.categorical_cols:
+            column = getattr(self, name)
+            arrays[f"{name}.values"] = column.values.astype(str)
+            arrays[f"{name}.codes"] = column.codes
+        for col, column in self.ranges.items():
+            arrays[f"{col}.order"] = column.order
+            arrays[f"{col}.sorted"] = column.sorted
+
+        os.makedirs(path, exist_ok=True)
+        for name, values in arrays.items():
+            np.save(os.path.join(path, name + ".npy"), values)
+
+    @classmethod
+    def load(cls, path: str):
+        """ Index saved by `save`, with the row arrays memory-mapped """
+        def array(name, mmap_mode="r"):
+            return np.load(os.path.join(path, name + ".npy"),
+                           mmap_mode=mmap_mode)
+
+        self = cls.__new__(cls)
+        self.size = int(array("size", None)[0])
+        for name in self.categorical_cols:
+            setattr(self, name, Categorical.from_arrays(
+                array(f"{name}.values", None), array(f"{name}.codes")))
+        self.street_grams = NGramIndex(self.street.values)
+        self.ranges = {c: SortedRange.from_arrays(array(f"{c}.order"),
+                                                  array(f"{c}.sorted"))
+                       for c in range_cols}
+        return self
+
+    def _range_mask(self, col: str, low, high) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.ranges[col].rows(low, high)] = True
+        return mask
+
+    def mask(self, params) -> np.ndarray:
+        """ Boolean mask of rows selected by FilterParams """
+        mask = self.flat.mask(params.flat)
+
+        # Month codes are sorted, so the last N values are the latest months
+        if params.month and params.month < len(self.month.values):
+            mask &= self.month.mask(self.month.values[-params.month:])
+        if params.town != "All":
+            mask &= self.town.mask([params.town])
+        if params.street:
+            mask &= self.street.mask_ids(
+                self.street_grams.search(params.street))
+
+        bounds = [
+            ('lease_yrs', params.min_lease, params.max_lease),
+            (params.price_col, params.min_price, params.max_price),
+            (params.area_type, params.min_area, params.max_area),
+        ]
+        for col, low, high in bounds:
+            if low or high:
+                mask &= self._range_mask(col, low or None, high or None)
+
+        return mask
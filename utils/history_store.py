@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+
+import polars as pl
+
+from .snapshot import MonthManifest
+
+hive_schema = {"year": pl.Int16, "month": pl.String}
+
+
+class HistoryStore(MonthManifest):
+    """ Processed resale transactions partitioned by year and month.
+
+    Each month is one Parquet file at `year=YYYY/month=YYYY-MM/part.parquet`
+    holding the typed columns the dashboard queries. The month itself is
+    only in the path, so scans prune partitions before reading anything.
+    `manifest.json` records which SnapshotStore file each month was built
+    from, so `sync` only converts months that changed.
+    """
+
+    def path(self, month: str) -> str:
+        return os.path.join(self.root, f"year={month[:4]}", f"month={month}",
+                            "part.parquet")
+
+    @property
+    def version(self) -> str:
+        """ Changes whenever any month is rewritten """
+        digest = hashlib.sha1(json.dumps(
+            self.manifest["months"], sort_keys=True).encode())
+        return digest.hexdigest()[:12]
+
+    def sync(self, store, process) -> list:
+        """ Convert new or refetched SnapshotStore months to partitions.
+
+        `process(raw, months)` turns raw records into the typed frame.
+        Returns the months written.
+        """
+        known = self.manifest["months"]
+        written = []
+        for month, entry in sorted(store.manifest["months"].items()):
+            if known.get(month, {}).get("source") == entry["file"]:
+                continue
+            df = process(store.load([month]), [month]).drop("month")
+            path = self.path(month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            df.write_parquet(path + ".tmp", statistics=True)
+            os.replace(path + ".tmp", path)
+            known[month] = {"source": entry["file"], "rows": df.shape[0]}
+            written.append(month)
+
+        if written:
+            self._write_manifest()
+        return written
+
+    def scan(self, months: list | None = None,
+             predicates: list | None = None) -> pl.LazyFrame | None:
+        """ Lazy frame over the partitions of `months`, all when None.
+
+        Unselected months are never opened, and `predicates` are pushed
+        down to the Parquet reader.
+        """
+        known = self.manifest["months"]
+        months = self.months() if months is None else sorted(months)
+        files = [self.path(m) for m in months if m in known]
+        if not files:
+            return None
+
+        lf = pl.scan_parquet(files, hive_partitioning=True,
+                             hive_schema=hive_schema)
+        if predicates:
+            lf = lf.filter(pl.all_horizontal(predicates))
+        return lf.drop("year")
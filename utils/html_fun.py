@@ -32,43 +32,41 @@ def output_table_format(msg: list, varname: str):
 
 
 def create_location_map_layer(df, search_pt, boundary, icon_fun,
-                              icon_color, final_msg, mp, marker_name):
+                              icon_color, final_msg, mp, marker_name,
+                              index=None):
     """ Takes multiple inputs to produce a map layer of certain attributions,
     such as subway or attractions. Output includes a map layer and result
-    table that lists the proximity of all selected markers
+    table that lists the proximity of all selected markers. `index` is the
+    layer dataset's SpatialIndex when the caller keeps one.
     """
-    tmp = dp.table_select_from_pt(df, search_pt, radius=boundary)
-    if tmp.shape[1] != 0:
-        stations = dict()
-        table_msg = list()
-        for i in range(tmp.shape[0]):
-
-            # Set important marker & route info
-            pt_info = tmp.loc[i]['loc_info']
-            pt_lat = tmp.loc[i]['LATITUDE']
-            pt_lon = tmp.loc[i]['LONGITUDE']
-
-            route_list, total_d = dp.create_route(search_pt, (pt_lat, pt_lon))
-            tooltip_msg = f"<div>To {pt_info} - <b>{total_d:,.0f}m</b></div>"
-
-            table_msg.append(tooltip_msg)
-            mrt_route = dl.Polyline(positions=route_list, interactive=True,
-                                    weight=5, color=icon_color)
-
-            mrt_pt = dl.DivMarker(position=(pt_lat, pt_lon),
-                                  children=popup_tooltip(tooltip_msg),
-                                  iconOptions=icon_fun)
-
-            stations[pt_info] = [mrt_pt, mrt_route]
-
-        # Loop through station map features
-        for s in list(stations.keys()):
-            tmp = create_layer_grp(stations[s], name=s)
-            mp.append(tmp)
-
-        if final_msg:
-            final_msg += output_table_format(table_msg, marker_name)
-        else:
-            final_msg = output_table_format(table_msg, marker_name)
-
+    tmp = dp.table_select_from_pt(df, search_pt, radius=boundary,
+                                  index=index)
+    if tmp.shape[0] == 0:
         return mp, final_msg
+
+    # Routes and distances for every marker at once
+    names = list(tmp['loc_info'])
+    lats, lons = list(tmp['LATITUDE']), list(tmp['LONGITUDE'])
+    routes, totals = dp.create_routes(search_pt, lats, lons)
+    table_msg = [f"<div>To {name} - <b>{total:,.0f}m</b></div>"
+                 for name, total in zip(names, totals.tolist())]
+
+    # One layer per place, a later row with the same name replaces it
+    stations = {
+        name: [dl.DivMarker(position=(lat, lon),
+                            children=popup_tooltip(msg),
+                            iconOptions=icon_fun),
+               dl.Polyline(positions=route, interactive=True, weight=5,
+                           color=icon_color)]
+        for name, lat, lon, route, msg in zip(names, lats, lons, routes,
+                                              table_msg)
+    }
+    mp.extend(create_layer_grp(layers, name=name)
+              for name, layers in stations.items())
+
+    if final_msg:
+        final_msg += output_table_format(table_msg, marker_name)
+    else:
+        final_msg = output_table_format(table_msg, marker_name)
+
+    return mp, final_msg
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import importlib.util
+import os
+
+import httpx
+
+# HTTP/2 needs the optional h2 package ( pip install httpx[http2] )
+http2 = importlib.util.find_spec("h2") is not None
+# Client and limit of a `run()` outside the app loop, seen by its tasks only
+_standalone = contextvars.ContextVar("standalone_client", default=None)
+
+
+class SharedClient:
+    """ One pooled httpx.AsyncClient for every outbound request.
+
+    FastAPI's lifespan calls `start()` and `aclose()`, so the client lives
+    on the app's event loop and keeps its HTTP/2 connections alive between
+    requests. At most `max_concurrency` requests are in flight at once,
+    across every caller. Synchronous code, such as the Dash app and the
+    refresh thread, uses `run()` to hand coroutines to that loop. Without
+    a running app, `run()` uses a short-lived client of its own, so
+    concurrent threads never share or close each other's connections.
+    """
+
+    def __init__(self, max_concurrency: int = 8, timeout: float = 30.0,
+                 connect_timeout: float = 10.0):
+        self.max_concurrency = max_concurrency
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._client: httpx.AsyncClient | None = None
+        self._limit: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _new_client(self) -> httpx.AsyncClient:
+        n = self.max_concurrency
+        return httpx.AsyncClient(
+            http2=http2, timeout=self.timeout, follow_redirects=True,
+            limits=httpx.Limits(max_connections=n,
+                                max_keepalive_connections=n))
+
+    def _open(self):
+        self._client = self._new_client()
+        self._limit = asyncio.Semaphore(self.max_concurrency)
+
+    async def start(self):
+        """ Bind to the running loop, called from the FastAPI lifespan """
+        if self._client is None or self._client.is_closed:
+            self._open()
+        self._loop = asyncio.get_running_loop()
+
+    async def aclose(self):
+        self._loop = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(self, method: str, url: str,
+                      **kwargs) -> httpx.Response:
+        standalone = _standalone.get()
+        if standalone is not None:
+            client, limit = standalone
+        else:
+            if self._client is None or self._client.is_closed:
+                self._open()
+            client, limit = self._client, self._limit
+        async with limit:
+            return await client.request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    def run(self, coro):
+        """ Run `coro` from a thread and wait for its result """
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            if asyncio._get_running_loop() is loop:
+                raise RuntimeError("SharedClient.run() would block its loop")
+            return asyncio.run_coroutine_threadsafe(coro, loop).result()
+        return asyncio.run(self._run_standalone(coro))
+
+    async def _run_standalone(self, coro):
+        async with self._new_client() as client:
+            _standalone.set(
+                (client, asyncio.Semaphore(self.max_concurrency)))
+            return await coro
+
+
+http_client = SharedClient(
+    max_concurrency=int(os.environ.get("HTTP_MAX_CONCURRENCY", 8)))
@@ -0,0 +1,44 @@
+import asyncio
+
+from fastapi.middleware.wsgi import WSGIMiddleware
+
+from .startup import startup_timer
+
+
+class LazyWSGIMount:
+    """ ASGI app that builds a WSGI sub-app on first use.
+
+    `loader` returns the WSGI app and may be slow (imports, data loading),
+    so it runs in a worker thread. Concurrent first requests wait for the
+    same build, and a failed build is retried on the next request.
+    """
+
+    def __init__(self, loader, name: str):
+        self.loader = loader
+        self.name = name
+        self._app = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._app is not None
+
+    async def load(self):
+        if self._app is None:
+            async with self._lock:
+                if self._app is None:
+                    with startup_timer.step(self.name):
+                        wsgi_app = await asyncio.to_thread(self.loader)
+                    self._app = WSGIMiddleware(wsgi_app)
+        return self._app
+
+    async def warm_up(self):
+        """ Build ahead of the first request, leaving failures to it """
+        try:
+            await self.load()
+        except Exception as e:
+            print(f"Unable to warm up {self.name}: {e}")
+
+    async def __call__(self, scope, receive, send):
+        app = await self.load()
+        await app(scope, receive, send)
@@ -0,0 +1,188 @@
+""" Timing spans, payload sizes and cache hit ratios in Prometheus format.
+
+Everything lives in this process, so with several uvicorn workers each
+scrape of /metrics sees the worker that answered it. METRICS_SAMPLE_RATE
+sets the share of spans and requests that are timed: 1 (the default)
+times all of them, 0 turns timing off so a span is a single comparison.
+Cache counters are read from the caches at scrape time and are exact
+whatever the rate.
+"""
+import bisect
+import functools
+import os
+import random
+import threading
+import time
+
+# Seconds, from sub-millisecond index lookups to a cold data.gov.sg fetch
+time_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                0.5, 1, 2.5, 5, 10, 30, 60)
+# Bytes, from a summary text to a full scatter figure
+size_buckets = tuple(2 ** i for i in range(10, 27, 2))
+
+
+class Histogram:
+    """ Cumulative Prometheus histogram keyed by one label """
+
+    def __init__(self, name: str, help: str, label: str, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._series: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            # Per bucket counts, then +Inf, sum
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = \
+                    [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}",
+                 f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for value, counts in sorted(series.items()):
+            label = f'{self.label}="{value}"'
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                total += count
+                lines.append(
+                    f'{self.name}_bucket{{{label},le="{bound}"}} {total}')
+            lines.append(f"{self.name}_sum{{{label}}} {counts[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {total}")
+        return lines
+
+
+class _Span:
+    __slots__ = ("histogram", "stage", "start")
+
+    def __init__(self, histogram: Histogram, stage: str):
+        self.histogram = histogram
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(self.stage, time.perf_counter() - self.start)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+no_span = _NoSpan()
+
+
+class Metrics:
+    """ Process-wide hot-path metrics, rendered by `render()` """
+
+    def __init__(self, sample_rate: float = 1.0):
+        self.sample_rate = sample_rate
+        self.stage_seconds = Histogram(
+            "hdb_stage_seconds", "Time spent per data path stage.",
+            "stage", time_buckets)
+        self.callback_seconds = Histogram(
+            "hdb_callback_seconds", "Time spent inside each Dash callback.",
+            "callback", time_buckets)
+        self.payload_bytes = Histogram(
+            "hdb_payload_bytes", "Size of Dash callback responses.",
+            "output", size_buckets)
+        self._caches: dict = {}
+        self._local = threading.local()
+
+    def sampled(self) -> bool:
+        rate = self.sample_rate
+        return rate >= 1 or rate > 0 and random.random() < rate
+
+    def span(self, stage: str):
+        """ Context manager timing one stage, a no-op when not sampled """
+        if not self.sampled():
+            return no_span
+        return _Span(self.stage_seconds, stage)
+
+    def timed(self, fn):
+        """ Time a Dash callback, keeping its duration for the request """
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not self.sampled():
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.callback_seconds.observe(fn.__name__, elapsed)
+                self._local.callback_seconds = elapsed
+        return wrapper
+
+    def instrument_dash(self, server, path: str = "/_dash-update-component"):
+        """ Payload size and serialization time of every Dash callback.
+
+        Serialization is the whole request less the callback itself, so it
+        also covers Dash parsing the request JSON.
+        """
+        from flask import g, request
+
+        @server.before_request
+        def start_request():
+            if request.path.endswith(path) and self.sampled():
+                g.metrics_start = time.perf_counter()
+                self._local.callback_seconds = None
+
+        @server.after_request
+        def end_request(response):
+            start = g.pop("metrics_start", None)
+            if start is None:
+                return response
+            total = time.perf_counter() - start
+            body = request.get_json(silent=True) or {}
+            output = str(body.get("output", "unknown"))
+            length = response.calculate_content_length()
+            if length is not None:
+                self.payload_bytes.observe(output, length)
+            callback = getattr(self._local, "callback_seconds", None)
+            if callback is not None:
+                self.stage_seconds.observe("serialize", total - callback)
+            return response
+
+    def watch_cache(self, name: str, cache):
+        """ Report a cache's `hits` and `misses` attributes when scraped """
+        self._caches[name] = cache
+
+    def render(self) -> str:
+        lines = []
+        for histogram in (self.stage_seconds, self.callback_seconds,
+                          self.payload_bytes):
+            lines += histogram.render()
+
+        stats = {name: (cache.hits, cache.misses)
+                 for name, cache in self._caches.items()}
+        for metric, kind, help, value in (
+                ("hdb_cache_hits_total", "counter", "Cache lookups served.",
+                 lambda h, m: h),
+                ("hdb_cache_misses_total", "counter", "Cache lookups built.",
+                 lambda h, m: m),
+                ("hdb_cache_hit_ratio", "gauge", "Hits over all lookups.",
+                 lambda h, m: round(h / (h + m), 4) if h + m else 0)):
+            lines += [f"# HELP {metric} {help}", f"# TYPE {metric} {kind}"]
+            lines += [f'{metric}{{cache="{name}"}} {value(h, m)}'
+                      for name, (h, m) in sorted(stats.items())]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(float(os.environ.get("METRICS_SAMPLE_RATE", 1)))
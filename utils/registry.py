@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import polars as pl
+
+from .cube import AggregateCube
+
+
+def version_of(df: pl.DataFrame) -> str:
+    """ Content hash, stable across processes for the same data """
+    digest = hashlib.sha1(str(df.schema).encode())
+    digest.update(df.hash_rows(seed=0).to_numpy().tobytes())
+    return digest.hexdigest()[:12]
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """ Immutable processed dataset plus the dropdown options and aggregate
+    cube derived from it """
+    version: str
+    df: pl.DataFrame
+    months: list
+    towns: list
+    flat_types: list
+    cube: AggregateCube
+    built_at: datetime = field(default_factory=datetime.now)
+
+    @classmethod
+    def from_frame(cls, df: pl.DataFrame, months: list):
+        return cls(
+            version=version_of(df),
+            df=df,
+            months=list(months),
+            towns=sorted(df["town"].unique().to_list()),
+            flat_types=sorted(df["flat"].unique().to_list()),
+            cube=AggregateCube.from_frame(df),
+        )
+
+
+class DatasetRegistry:
+    """ Server-side store of processed snapshots keyed by version.
+
+    Dash callbacks receive only the version id from the browser and look the
+    frame up here, so the dataset never travels through the client. A few
+    recent versions are kept so pages loaded before a refresh keep working,
+    and `publish` swaps in a new current snapshot in one step. Snapshots of
+    other month windows are registered with `add`, and never become
+    current.
+    """
+
+    def __init__(self, keep: int = 2, keep_windows: int = 2):
+        self.keep = keep
+        self.keep_windows = keep_windows
+        self._snapshots: OrderedDict[str, Snapshot] = OrderedDict()
+        self._windows: OrderedDict[str, Snapshot] = OrderedDict()
+        self._current: Snapshot | None = None
+        self._lock = threading.Lock()
+
+    def add(self, snapshot: Snapshot) -> str:
+        """ Register a snapshot of another month window """
+        with self._lock:
+            self._windows[snapshot.version] = snapshot
+            self._windows.move_to_end(snapshot.version)
+            while len(self._windows) > self.keep_windows:
+                self._windows.popitem(last=False)
+        return snapshot.version
+
+    def publish(self, snapshot: Snapshot) -> str:
+        """ Make a fully built snapshot the current one """
+        with self._lock:
+            self._snapshots[snapshot.version] = snapshot
+            self._snapshots.move_to_end(snapshot.version)
+            while len(self._snapshots) > self.keep:
+                self._snapshots.popitem(last=False)
+            self._current = snapshot
+        return snapshot.version
+
+    @property
+    def current(self) -> Snapshot:
+        return self._current
+
+    def snapshot(self, version: str | None = None) -> Snapshot:
+        """ Snapshot for a version, or the current one if it was dropped """
+        with self._lock:
+            snapshot = self._snapshots.get(version) or \
+                self._windows.get(version)
+            return snapshot or self._current
+
+    def resolve(self, version: str | None) -> str:
+        """ The version itself while it is kept, else the current one """
+        with self._lock:
+            if version in self._snapshots or version in self._windows:
+                return version
+            return self._current.version
+
+    def get(self, version: str) -> pl.DataFrame:
+        """ Frame of a kept version, KeyError once it has been dropped """
+        with self._lock:
+            snapshot = self._snapshots.get(version) or \
+                self._windows.get(version)
+        if snapshot is None:
+            raise KeyError(f"Snapshot {version} is no longer kept")
+        return snapshot.df
+
+
+registry = DatasetRegistry()
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import abc
+import collections
+import hashlib
+import time
+from dataclasses import dataclass
+
+from starlette.datastructures import Headers, MutableHeaders
+
+# Validators the middleware answers itself, never passed to the app
+conditional_headers = (b"if-none-match", b"if-modified-since")
+# Replaced on every response served from the cache
+replaced_headers = ("content-length", "cache-control", "etag", "age")
+
+
+@dataclass(frozen=True)
+class CacheRule:
+    """ How long a route is cached here, at the CDN and while stale """
+    ttl: float
+    stale: float = 0
+
+    @property
+    def cache_control(self) -> str:
+        # Browsers revalidate every time, which is a cheap 304 from here
+        value = f"public, max-age=0, s-maxage={int(self.ttl)}"
+        if self.stale:
+            value += f", stale-while-revalidate={int(self.stale)}"
+        return value
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """ A rendered 200 response with its strong ETag """
+    headers: list
+    body: bytes
+    etag: str
+    stored_at: float
+
+
+class ResponseCacheBackend(abc.ABC):
+    """ Storage for rendered responses, subclass for a shared store """
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> CachedResponse | None:
+        """ Entry for a key, None when missing or expired """
+
+    @abc.abstractmethod
+    async def set(self, key: str, entry: CachedResponse, ttl: float):
+        """ Store an entry for `ttl` seconds """
+
+    @abc.abstractmethod
+    async def clear(self):
+        """ Drop every entry """
+
+
+class MemoryBackend(ResponseCacheBackend):
+    """ Per-process LRU of responses, each dropped once its TTL passes """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: collections.OrderedDict = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> CachedResponse | None:
+        item = self._entries.get(key)
+        if item is not None and time.monotonic() >= item[1]:
+            del self._entries[key]
+            item = None
+        if item is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return item[0]
+
+    async def set(self, key: str, entry: CachedResponse, ttl: float):
+        self._entries[key] = (entry, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def clear(self):
+        self._entries.clear()
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """ Whether an If-None-Match header lists `etag`, weak or strong """
+    if if_none_match is None:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+class ResponseCacheMiddleware:
+    """ Cache rendered GET responses of selected routes.
+
+    `rules` maps a path, or a path prefix ending in "/", to a CacheRule;
+    the longest match wins and other paths pass straight through. Only
+    200 responses without cookies are stored, keyed by host, path and
+    query. The app's own ETag is kept, otherwise a strong one is computed
+    from the body. Conditional requests are answered with 304 from the
+    cache, and every cached route gets `s-maxage` and
+    `stale-while-revalidate` for the CDN.
+    """
+
+    def __init__(self, app, rules: dict, backend: ResponseCacheBackend = None):
+        self.app = app
+        self.rules = sorted(rules.items(), key=lambda r: len(r[0]),
+                            reverse=True)
+        self.backend = backend or MemoryBackend()
+
+    def rule(self, path: str) -> CacheRule | None:
+        for route, rule in self.rules:
+            if path == route or route.endswith("/") and \
+                    path.startswith(route):
+                return rule
+        return None
+
+    async def __call__(self, scope, receive, send):
+        rule = self.rule(scope["path"]) if scope["type"] == "http" and \
+            scope["method"] == "GET" else None
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        query = scope["query_string"].decode("latin-1")
+        key = f"{headers.get('host', '')}{scope['path']}?{query}"
+        entry = await self.backend.get(key)
+        if entry is None:
+            entry = await self._render(scope, receive, send)
+            if entry is None:
+                return
+            await self.backend.set(key, entry, rule.ttl)
+
+        response = MutableHeaders(raw=[
+            (k, v) for k, v in entry.headers
+            if k.decode("latin-1") not in replaced_headers])
+        response["etag"] = entry.etag
+        response["cache-control"] = rule.cache_control
+        response["age"] = str(int(time.time() - entry.stored_at))
+        if etag_matches(headers.get("if-none-match"), entry.etag):
+            del response["content-type"]
+            await send({"type": "http.response.start", "status": 304,
+                        "headers": response.raw})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        response["content-length"] = str(len(entry.body))
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": response.raw})
+        await send({"type": "http.response.body", "body": entry.body})
+
+    async def _render(self, scope, receive, send) -> CachedResponse | None:
+        """ Run the app for a full response, None if it was sent uncached """
+        scope = dict(scope, headers=[
+            (k, v) for k, v in scope["headers"]
+            if k not in conditional_headers])
+        messages = []
+
+        async def capture(message):
+            messages.append(message)
+
+        await self.app(scope, receive, capture)
+        start = next(m for m in messages
+                     if m["type"] == "http.response.start")
+        body = b"".join(m.get("body", b"") for m in messages
+                        if m["type"] == "http.response.body")
+        headers = Headers(raw=start.get("headers", []))
+        if start["status"] != 200 or "set-cookie" in headers or \
+                "no-store" in headers.get("cache-control", ""):
+            for message in messages:
+                await send(message)
+            return None
+
+        etag = headers.get("etag") or \
+            f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        return CachedResponse(list(headers.raw), body, etag, time.time())
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import threading
+import time
+
+
+class RefreshScheduler:
+    """ Runs `job` in a daemon thread every `interval` seconds.
+
+    A failing run is logged and retried on the next tick, so the last good
+    snapshot keeps being served.
+    """
+
+    def __init__(self, job, interval: float, name: str = "refresh"):
+        self.job = job
+        self.interval = interval
+        self.name = name
+        self.last_run: float | None = None
+        self.last_error: Exception | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self, run_now: bool = True):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(run_now,), name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_once(self):
+        try:
+            self.job()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = e
+            print(f"{self.name} failed, keeping last snapshot: {e}")
+        self.last_run = time.time()
+
+    def _run(self, run_now: bool):
+        if run_now:
+            self.run_once()
+        while not self._stop.wait(self.interval):
+            self.run_once()
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import polars as pl
+
+from .cube import AggregateCube
+from .filter_engine import rounded_columns
+from .hdb_index import DatasetIndex
+from .registry import Snapshot
+
+
+@dataclass(frozen=True)
+class SharedEntry:
+    """ A published snapshot with its memory-mapped index and display columns """
+    snapshot: Snapshot
+    index: DatasetIndex
+    rounded: pl.DataFrame
+
+
+class SharedSnapshot:
+    """ Processed snapshot shared by several worker processes.
+
+    One process holds `loader.lock` and is the only one that talks to
+    data.gov.sg. For each processed snapshot it writes the frame and its
+    rounded display columns as uncompressed Arrow files, plus the filter
+    index as .npy arrays, then points `current.json` at them. Every worker,
+    the loader included, memory-maps these read-only so the OS page cache
+    holds a single copy however many workers there are. If the loader exits
+    its lock is released and the next worker to poll takes over.
+    """
+
+    pointer_name = "current.json"
+    lock_name = "loader.lock"
+
+    def __init__(self, root: str, keep: int = 2):
+        self.root = root
+        self.keep = keep
+        self._lock_file = None
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def pointer_path(self) -> str:
+        return os.path.join(self.root, self.pointer_name)
+
+    def acquire_loader(self) -> bool:
+        """ Become the loader unless another live process already is """
+        if self._lock_file is None:
+            f = open(os.path.join(self.root, self.lock_name), "a")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+            self._lock_file = f
+        return True
+
+    def _read_pointer(self) -> dict | None:
+        try:
+            with open(self.pointer_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def refreshed_at(self) -> float:
+        """ Unix time of the loader's last data.gov.sg refresh, 0 if never """
+        pointer = self._read_pointer()
+        return pointer.get("refreshed_at", 0) if pointer else 0
+
+    def _paths(self, version: str) -> dict:
+        names = ("arrow", "display.arrow", "cube.arrow", "index")
+        return {name: os.path.join(self.root, f"{version}.{name}")
+                for name in names}
+
+    def publish(self, snapshot: Snapshot, refreshed_at: float | None = None):
+        """ Write a snapshot and atomically point workers at it """
+        paths = self._paths(snapshot.version)
+        frames = {
+            "arrow": lambda: snapshot.df,
+            "display.arrow": lambda: rounded_columns(snapshot.df),
+            "cube.arrow": lambda: snapshot.cube.frame,
+        }
+        for name, frame in frames.items():
+            if not os.path.exists(paths[name]):
+                frame().write_ipc(paths[name] + ".tmp",
+                                  compression="uncompressed")
+                os.replace(paths[name] + ".tmp", paths[name])
+        if not os.path.exists(paths["index"]):
+            shutil.rmtree(paths["index"] + ".tmp", ignore_errors=True)
+            DatasetIndex(snapshot.df).save(paths["index"] + ".tmp")
+            os.replace(paths["index"] + ".tmp", paths["index"])
+
+        if refreshed_at is None:
+            refreshed_at = time.time()
+        previous = (self._read_pointer() or {}).get("history", [])
+        pointer = {
+            "version": snapshot.version,
+            "months": snapshot.months,
+            "towns": snapshot.towns,
+            "flat_types": snapshot.flat_types,
+            "built_at": snapshot.built_at.isoformat(timespec="seconds"),
+            "refreshed_at": refreshed_at,
+            "history": ([snapshot.version] + [
+                v for v in previous if v != snapshot.version])[:self.keep],
+        }
+        with open(self.pointer_path + ".tmp", "w") as f:
+            json.dump(pointer, f, indent=2)
+        os.replace(self.pointer_path + ".tmp", self.pointer_path)
+        self._remove_stale(pointer["history"])
+
+    def _remove_stale(self, history: list):
+        # Workers still mapping a removed file keep their pages until unmapped
+        keep = {path for v in history for path in self._paths(v).values()}
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name in (self.pointer_name, self.lock_name) or path in keep \
+                    or name.endswith(".tmp"):
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def read(self) -> SharedEntry | None:
+        """ Memory-map the current snapshot, None until one is published """
+        pointer = self._read_pointer()
+        if pointer is None:
+            return None
+        paths = self._paths(pointer["version"])
+        try:
+            df = pl.read_ipc(paths["arrow"], memory_map=True)
+            rounded = pl.read_ipc(paths["display.arrow"], memory_map=True)
+            cube = AggregateCube(pl.read_ipc(paths["cube.arrow"]))
+            index = DatasetIndex.load(paths["index"])
+        except FileNotFoundError:
+            return None
+
+        snapshot = Snapshot(
+            version=pointer["version"],
+            df=df,
+            months=pointer["months"],
+            towns=pointer["towns"],
+            flat_types=pointer["flat_types"],
+            cube=cube,
+            built_at=datetime.fromisoformat(pointer["built_at"]),
+        )
+        return SharedEntry(snapshot, index, rounded)
+
+    def wait(self, timeout: float = 60,
+             poll: float = 0.5) -> SharedEntry | None:
+        """ Block until the loader has published, or `timeout` passes """
+        deadline = time.monotonic() + timeout
+        while True:
+            entry = self.read()
+            if entry is not None or time.monotonic() >= deadline:
+                return entry
+            time.sleep(poll)
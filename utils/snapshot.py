@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import json
+import os
+import uuid
+from datetime import date, datetime
+
+import polars as pl
+
+
+class MonthManifest:
+    """ Directory of per-month files listed in `manifest.json` """
+
+    manifest_name = "manifest.json"
+
+    def __init__(self, root: str):
+        self.root = root
+        self.manifest = self._read_manifest()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.root, self.manifest_name)
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"months": {}}
+
+    def _write_manifest(self):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def reload(self):
+        """ Pick up months another process wrote """
+        self.manifest = self._read_manifest()
+
+    def months(self) -> list:
+        return sorted(self.manifest["months"])
+
+
+class SnapshotStore(MonthManifest):
+    """ On-disk store of monthly HDB resale snapshots.
+
+    Each month lives in its own uncompressed Arrow IPC file so it can be
+    memory-mapped on cold start. `manifest.json` records what is on disk,
+    when it was fetched and whether the month is final. Final months are
+    never downloaded again.
+    """
+
+    def __init__(self, root: str, final_lag_months: int = 2):
+        self.final_lag_months = final_lag_months
+        super().__init__(root)
+
+    def is_final(self, month: str, as_of: date) -> bool:
+        """ A month is final once `final_lag_months` have passed after it """
+        yr, mth = [int(i) for i in month.split("-")]
+        mth += self.final_lag_months
+        yr, mth = yr + (mth - 1) // 12, (mth - 1) % 12 + 1
+        return as_of >= date(yr, mth, 1)
+
+    def pending(self, months: list) -> list:
+        """ Months that are missing on disk or were fetched before final """
+        known = self.manifest["months"]
+        return [m for m in months
+                if m not in known or not known[m].get("final", False)]
+
+    def write_month(self, month: str, df: pl.DataFrame,
+                    fetched_at: datetime | None = None):
+        """ Atomically replace a month's file and record it in the manifest """
+        fetched_at = fetched_at or datetime.now()
+        os.makedirs(self.root, exist_ok=True)
+
+        # New name per write, memory-mapped readers keep their old file
+        file_name = f"{month}.{uuid.uuid4().hex[:8]}.arrow"
+        path = os.path.join(self.root, file_name)
+        df.write_ipc(path + ".tmp", compression="uncompressed")
+        os.replace(path + ".tmp", path)
+
+        previous = self.manifest["months"].get(month, {}).get("file")
+        self.manifest["months"][month] = {
+            "file": file_name,
+            "rows": df.shape[0],
+            "fetched_at": fetched_at.isoformat(timespec="seconds"),
+            "final": self.is_final(month, fetched_at.date()),
+        }
+        self._write_manifest()
+
+        if previous and previous != file_name:
+            try:
+                os.remove(os.path.join(self.root, previous))
+            except FileNotFoundError:
+                pass
+
+    def load(self, months: list) -> pl.DataFrame | None:
+        """ Memory-map the requested months that exist on disk """
+        known = self.manifest["months"]
+        frames = [
+            pl.read_ipc(os.path.join(self.root, known[m]["file"]),
+                        memory_map=True)
+            for m in months if m in known
+        ]
+        if not frames:
+            return None
+        return pl.concat(frames, how="vertical_relaxed")
@@ -0,0 +1,69 @@
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # Falls back to a latitude-sorted search
+    cKDTree = None
+
+earth_radius_m = 6_371_008.8
+
+
+def haversine(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """ Great-circle distance in metres, broadcast over arrays """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * earth_radius_m * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def unit_vectors(lat, lon) -> np.ndarray:
+    """ Points on the unit sphere, where chord length orders like haversine """
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon),
+                            np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+class SpatialIndex:
+    """ Radius queries over fixed points such as MRT stations or amenities.
+
+    Points are stored as unit vectors in a KD-tree, so a query only visits
+    the branches the search circle touches. Without scipy the points are
+    sorted by latitude and a query binary-searches the band it can reach.
+    Either way candidates are confirmed by exact haversine distance.
+    """
+
+    def __init__(self, lat, lon):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        if cKDTree is not None:
+            self.tree = cKDTree(unit_vectors(self.lat, self.lon))
+        else:
+            self.tree = None
+            self.order = np.argsort(self.lat, kind="stable")
+            self.sorted_lat = self.lat[self.order]
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def _candidates(self, lat: float, lon: float,
+                    radius: float) -> np.ndarray:
+        angle = min(radius / earth_radius_m, np.pi)
+        if self.tree is not None:
+            chord = 2 * np.sin(angle / 2)
+            # Slack so points exactly on the circle survive rounding
+            return np.asarray(self.tree.query_ball_point(
+                unit_vectors(lat, lon)[0], chord * (1 + 1e-9)), dtype=np.intp)
+        band = np.degrees(angle)
+        lo = np.searchsorted(self.sorted_lat, lat - band, "left")
+        hi = np.searchsorted(self.sorted_lat, lat + band, "right")
+        return self.order[lo:hi]
+
+    def query_radius(self, lat: float, lon: float, radius: float):
+        """ Positions within `radius` metres and their distances, nearest
+        first """
+        rows = self._candidates(lat, lon, radius)
+        distance = haversine(lat, lon, self.lat[rows], self.lon[rows])
+        keep = distance <= radius
+        rows, distance = rows[keep], distance[keep]
+        order = np.argsort(distance, kind="stable")
+        return rows[order], distance[order]
@@ -0,0 +1,30 @@
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """ Wall-clock time of each startup component, logged as it finishes """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings: dict[str, float] = {}
+
+    def _record(self, name: str, seconds: float):
+        self.timings[name] = seconds
+        print(f"startup: {name} {seconds:.2f}s")
+
+    @contextmanager
+    def step(self, name: str):
+        """ Time the body of a `with` block """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - start)
+
+    def mark(self, name: str):
+        """ Time since startup timing began, i.e. since this module was imported """
+        self._record(name, time.perf_counter() - self.started)
+
+
+startup_timer = StartupTimer()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+from mimetypes import guess_type
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from . import assets
+
+# name.<8 hex>.ext is content addressed and never changes
+hashed_name = re.compile(r"\.[0-9a-f]{8}\.[A-Za-z0-9.]+$")
+
+
+def accepted_encodings(headers: Headers) -> set:
+    """ Content codings the client accepts, skipping any with q=0 """
+    accepted = set()
+    for item in headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            accepted.add(coding.lower())
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """ StaticFiles with precompressed variants and cache headers.
+
+    A `.br` or `.gz` file next to the requested one is served when the
+    client accepts that coding. Content-hashed names are cached as
+    immutable, HTML must be revalidated and everything else is cached for
+    an hour. Pages rebuilt by `utils.assets` are served in place of their
+    originals in static/img.
+    """
+
+    encodings = (("br", ".br"), ("gzip", ".gz"))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._rewrites: tuple | None = None
+
+    def rewrites(self) -> dict:
+        """ static/img page -> slim static/dist page, reloaded on rebuild """
+        path = os.path.join(self.directory, "dist", assets.manifest_name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except (FileNotFoundError, TypeError):
+            return {}
+        if self._rewrites is None or self._rewrites[0] != mtime:
+            try:
+                with open(path) as f:
+                    manifest = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                return {}
+            pages = {os.path.normpath(k): os.path.normpath(v)
+                     for k, v in manifest.get("pages", {}).items()}
+            self._rewrites = (mtime, pages)
+        return self._rewrites[1]
+
+    async def get_response(self, path: str, scope) -> Response:
+        return await super().get_response(self.rewrites().get(path, path),
+                                          scope)
+
+    @staticmethod
+    def cache_control(path: str) -> str:
+        if hashed_name.search(os.path.basename(path)):
+            return "public, max-age=31536000, immutable"
+        if path.endswith(".html"):
+            return "no-cache"
+        return "public, max-age=3600"
+
+    def file_response(self, full_path, stat_result, scope,
+                      status_code: int = 200) -> Response:
+        full_path = str(full_path)
+        request_headers = Headers(scope=scope)
+        headers = {"Cache-Control": self.cache_control(full_path)}
+        media_type = guess_type(full_path)[0] or "text/plain"
+
+        response = None
+        variants = [(c, full_path + s) for c, s in self.encodings
+                    if os.path.exists(full_path + s)]
+        if variants:
+            headers["Vary"] = "Accept-Encoding"
+            accepted = accepted_encodings(request_headers)
+            for coding, variant in variants:
+                if coding in accepted:
+                    response = FileResponse(
+                        variant, status_code=status_code,
+                        headers={**headers, "Content-Encoding": coding},
+                        media_type=media_type,
+                        stat_result=os.stat(variant))
+                    break
+        if response is None:
+            response = FileResponse(
+                full_path, status_code=status_code, headers=headers,
+                media_type=media_type, stat_result=stat_result)
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
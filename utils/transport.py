@@ -0,0 +1,88 @@
+import base64
+
+import numpy as np
+import polars as pl
+
+# Plotly.js typed array names, see plotly.js `decode_typed_array`
+plotly_dtypes = {
+    np.dtype("int8"): "i1", np.dtype("uint8"): "u1",
+    np.dtype("int16"): "i2", np.dtype("uint16"): "u2",
+    np.dtype("int32"): "i4", np.dtype("uint32"): "u4",
+    np.dtype("float32"): "f4", np.dtype("float64"): "f8",
+}
+# 64-bit integers are not supported by plotly.js typed arrays
+downcast = {np.dtype("int64"): np.int32, np.dtype("uint64"): np.uint32,
+            np.dtype("bool"): np.uint8}
+
+
+def encode_array(values) -> dict:
+    """ Numeric array -> Plotly typed array spec {dtype, bdata, shape} """
+    values = np.asarray(values)
+    if values.dtype in downcast:
+        values = values.astype(downcast[values.dtype])
+    values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder("<"))
+
+    spec = {
+        "dtype": plotly_dtypes[values.dtype.newbyteorder("=")],
+        "bdata": base64.b64encode(values.tobytes()).decode("ascii"),
+    }
+    if values.ndim > 1:
+        spec["shape"] = ",".join(str(i) for i in values.shape)
+    return spec
+
+
+def decode_array(spec) -> np.ndarray:
+    """ Inverse of encode_array, plain lists are passed through numpy """
+    if not isinstance(spec, dict):
+        return np.asarray(spec)
+    values = np.frombuffer(base64.b64decode(spec["bdata"]),
+                           dtype=np.dtype(spec["dtype"]).newbyteorder("<"))
+    if "shape" in spec:
+        values = values.reshape([int(i) for i in spec["shape"].split(",")])
+    return values
+
+
+def encode_labels(values) -> dict:
+    """ Strings -> {values, codes}: each distinct string once, plus a typed
+    array of codes into them. assets/transport.js expands them back. """
+    values = np.asarray(values, dtype=object)
+    missing = np.equal(values, None)
+    distinct, codes = np.unique(values[~missing], return_inverse=True)
+    distinct = distinct.tolist()
+    if missing.any():
+        full = np.empty(len(values), dtype=np.int64)
+        full[~missing], full[missing] = codes, len(distinct)
+        codes = full
+        distinct.append(None)
+    dtype = np.uint8 if len(distinct) <= 2 ** 8 else \
+        np.uint16 if len(distinct) <= 2 ** 16 else np.uint32
+    return {"values": distinct, "codes": encode_array(codes.astype(dtype))}
+
+
+def decode_labels(spec) -> list:
+    """ Inverse of encode_labels, plain lists are passed through """
+    if not isinstance(spec, dict):
+        return list(spec)
+    values = spec["values"]
+    return [values[i] for i in decode_array(spec["codes"])]
+
+
+def encode_columns(df) -> dict:
+    """ Polars frame -> column-wise typed arrays and labels, with numeric
+    nulls sent as NaN """
+    columns = {}
+    for name, series in zip(df.columns, df.get_columns()):
+        if series.dtype.is_numeric():
+            columns[name] = encode_array(
+                series.cast(pl.Float64).fill_null(float("nan")).to_numpy())
+        else:
+            columns[name] = encode_labels(series.cast(pl.Utf8).to_numpy())
+    return {"columns": columns, "rows": df.shape[0]}
+
+
+def decode_columns(spec) -> pl.DataFrame:
+    """ Inverse of encode_columns, NaN comes back as null """
+    return pl.DataFrame({
+        name: decode_labels(column) if "values" in column
+        else pl.Series(decode_array(column)).fill_nan(None)
+        for name, column in spec["columns"].items()})
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+
+import plotly.graph_objects as go
+import polars as pl
+from plotly.offline import get_plotlyjs_version
+
+default_dir = os.environ.get("HDB_CHARTS_DIR", "data/charts")
+plotlyjs_src = f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"
+
+# Price bands of the stacked bar charts, upper bounds are exclusive
+price_bands = [
+    ("< 300K", None, 300_000),
+    ("300K - 500K", 300_000, 500_000),
+    ("500K - 800K", 500_000, 800_000),
+    ("800K - 1M", 800_000, 1_000_000),
+    (">= 1M", 1_000_000, None),
+]
+band_colors = ["#93C5FD", "#3B82F6", "#FCA5A5", "#EF4444", "#7F1D1D"]
+
+# Template variable -> fragment name
+fragment_names = {
+    "gh_html_content_1": "mth_boxplot",
+    "gh_html_content_2": "mth_barline_chart",
+    "gh_html_content_3": "mth_stack_bar_values",
+    "gh_html_content_4": "mth_stack_bar_percent",
+}
+
+
+def _band(low, high) -> pl.Expr:
+    price = pl.col("price")
+    if low is None:
+        return price < high
+    if high is None:
+        return price >= low
+    return (price >= low) & (price < high)
+
+
+def month_stats(raw: pl.DataFrame) -> pl.DataFrame:
+    """ Per-month resale price figures behind the trend charts """
+    df = raw.select(
+        "month", pl.col("resale_price").cast(pl.Float64).alias("price"))
+    price = pl.col("price")
+
+    stats = df.group_by("month").agg(
+        pl.len().cast(pl.Int64).alias("count"),
+        price.min().alias("min"),
+        price.quantile(0.25, "linear").alias("q1"),
+        price.median().alias("median"),
+        price.quantile(0.75, "linear").alias("q3"),
+        price.max().alias("max"),
+        *[_band(low, high).sum().cast(pl.Int64).alias(name)
+          for name, low, high in price_bands],
+    )
+
+    # Whiskers end at the furthest prices within 1.5 IQR, as in a boxplot
+    iqr = pl.col("q3") - pl.col("q1")
+    fences = df.join(stats.select("month", "q1", "q3"), on="month").filter(
+        price.is_between(pl.col("q1") - 1.5 * iqr, pl.col("q3") + 1.5 * iqr)
+    ).group_by("month").agg(
+        price.min().alias("lowerfence"),
+        price.max().alias("upperfence"),
+    )
+    return stats.join(fences, on="month", how="left").sort("month")
+
+
+def _layout(fig, title, **kwargs):
+    fig.update_layout(
+        title=f"<b>{title}</b>",
+        plot_bgcolor='white',
+        legend=dict(orientation="h", yanchor="bottom", y=1.02,
+                    xanchor="left", x=0),
+        yaxis={"gridcolor": '#d3d3d3'},
+        height=550,
+        margin=dict(l=5, r=5),
+        **kwargs,
+    )
+    return fig
+
+
+def box_chart(stats: pl.DataFrame) -> go.Figure:
+    """ Monthly price boxplots, red where the median is at least 500K """
+    fig = go.Figure()
+    for name, color, expensive in (("Median < 500K", "#3B82F6", False),
+                                   ("Median >= 500K", "#DC2626", True)):
+        part = stats.filter((pl.col("median") >= 500_000) == expensive)
+        if part.height:
+            fig.add_trace(go.Box(
+                name=name, x=part["month"].to_list(),
+                q1=part["q1"].to_list(), median=part["median"].to_list(),
+                q3=part["q3"].to_list(),
+                lowerfence=part["lowerfence"].to_list(),
+                upperfence=part["upperfence"].to_list(),
+                marker_color=color))
+    return _layout(fig, "Monthly Public Home Resale Prices",
+                   yaxis_title="price")
+
+
+def million_chart(stats: pl.DataFrame) -> go.Figure:
+    """ Million dollar sales as a count and as a share of all sales """
+    share = (stats[">= 1M"] / stats["count"] * 100).round(2)
+    fig = go.Figure([
+        go.Bar(name="Million dollar homes", x=stats["month"].to_list(),
+               y=stats[">= 1M"].to_list(), marker_color="#FCA5A5"),
+        go.Scatter(name="% of homes sold", x=stats["month"].to_list(),
+                   y=share.to_list(), yaxis="y2", mode="lines+markers",
+                   line_color="#DC2626"),
+    ])
+    return _layout(fig, "Million Dollar Public Homes Sold",
+                   yaxis2={"title": "% of homes sold", "overlaying": "y",
+                           "side": "right"})
+
+
+def band_chart(stats: pl.DataFrame, percent: bool = False) -> go.Figure:
+    """ Monthly sales stacked by price band, as counts or percentages """
+    fig = go.Figure()
+    for (name, _, _), color in zip(price_bands, band_colors):
+        values = stats[name]
+        if percent:
+            values = (values / stats["count"] * 100).round(2)
+        fig.add_trace(go.Bar(name=name, x=stats["month"].to_list(),
+                             y=values.to_list(), marker_color=color))
+    title = "Share of Sales by Price Band (%)" if percent \
+        else "Sales by Price Band"
+    return _layout(fig, title, barmode="stack")
+
+
+class TrendCharts:
+    """ Trend page charts built from the local snapshot store.
+
+    Per-month figures are kept in `stats.arrow`, keyed in `manifest.json`
+    by the store file they came from, so an update only reads months that
+    changed since the last run. Fragments are rendered into a directory
+    named after the content hash of the figures and `current.json` is then
+    pointed at it, so readers always see a complete set.
+    """
+
+    def __init__(self, root: str = default_dir, start: str = "2017-01",
+                 keep: int = 2):
+        self.root = root
+        self.start = start
+        self.keep = keep
+        self._loaded: tuple | None = None
+
+    def _path(self, *parts) -> str:
+        return os.path.join(self.root, *parts)
+
+    def _read_json(self, name: str) -> dict | None:
+        try:
+            with open(self._path(name)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_json(self, name: str, data: dict):
+        with open(self._path(name) + ".tmp", "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(self._path(name) + ".tmp", self._path(name))
+
+    def _load_stats(self) -> pl.DataFrame | None:
+        try:
+            return pl.read_ipc(self._path("stats.arrow"), memory_map=False)
+        except FileNotFoundError:
+            return None
+
+    def months(self) -> list:
+        """ Months already summarised in `stats.arrow` """
+        stats = self._load_stats()
+        return [] if stats is None else stats["month"].to_list()
+
+    def update(self, store) -> str | None:
+        """ Recompute changed months and re-render if the figures changed """
+        os.makedirs(self.root, exist_ok=True)
+        sources = {m: entry["file"]
+                   for m, entry in store.manifest["months"].items()
+                   if m >= self.start}
+        manifest = self._read_json("manifest.json") or {"sources": {}}
+        stats = self._load_stats()
+        if stats is None:
+            manifest["sources"] = {}
+
+        changed = [m for m, f in sources.items()
+                   if manifest["sources"].get(m) != f]
+        if changed:
+            fresh = month_stats(store.load(changed))
+            if stats is not None:
+                fresh = pl.concat([
+                    stats.filter(~pl.col("month").is_in(changed)), fresh,
+                ], how="vertical_relaxed")
+            stats = fresh.sort("month")
+            stats.write_ipc(self._path("stats.arrow") + ".tmp")
+            os.replace(self._path("stats.arrow") + ".tmp",
+                       self._path("stats.arrow"))
+            manifest["sources"] = sources
+            self._write_json("manifest.json", manifest)
+
+        if stats is None or stats.height == 0:
+            return None
+        return self._render(stats)
+
+    def _render(self, stats: pl.DataFrame) -> str:
+        digest = hashlib.sha1(str(stats.schema).encode())
+        digest.update(stats.hash_rows(seed=0).to_numpy().tobytes())
+        version = digest.hexdigest()[:12]
+
+        current = self._read_json("current.json") or {}
+        if current.get("version") == version and \
+                os.path.isdir(self._path(version)):
+            return version
+
+        figures = {
+            "mth_boxplot": box_chart(stats),
+            "mth_barline_chart": million_chart(stats),
+            "mth_stack_bar_values": band_chart(stats),
+            "mth_stack_bar_percent": band_chart(stats, percent=True),
+        }
+        tmp = self._path(version + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, fig in figures.items():
+            html = fig.to_html(full_html=False, include_plotlyjs=False,
+                               div_id=name, config={"responsive": True})
+            with open(os.path.join(tmp, name + ".html"), "w") as f:
+                f.write(html)
+        shutil.rmtree(self._path(version), ignore_errors=True)
+        os.replace(tmp, self._path(version))
+
+        history = [version] + [v for v in current.get("history", [])
+                               if v != version]
+        self._write_json("current.json", {
+            "version": version,
+            "months": [stats["month"][0], stats["month"][-1]],
+            "history": history[:self.keep],
+        })
+        for old in history[self.keep:]:
+            shutil.rmtree(self._path(old), ignore_errors=True)
+        print(f"Trend charts {version} rendered "
+              f"({stats['month'][0]} to {stats['month'][-1]})")
+        return version
+
+    def fragments(self) -> dict | None:
+        """ Template variable -> fragment HTML, None until first rendered """
+        try:
+            mtime = os.stat(self._path("current.json")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if self._loaded is None or self._loaded[0] != mtime:
+            version = (self._read_json("current.json") or {}).get("version")
+            if version is None:
+                return None
+            try:
+                charts = {}
+                for var, name in fragment_names.items():
+                    with open(self._path(version, name + ".html")) as f:
+                        charts[var] = f.read()
+            except FileNotFoundError:
+                # Replaced while reading, keep what was loaded before
+                return self._loaded[1] if self._loaded else None
+            self._loaded = (mtime, charts)
+        return self._loaded[1]